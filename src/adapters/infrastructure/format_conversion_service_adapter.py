@@ -1,13 +1,28 @@
 from domain.PdfImages import PdfImages
 from domain.PdfSegment import PdfSegment
 from ports.services.format_conversion_service import FormatConversionService
-from adapters.infrastructure.format_converters.convert_table_to_html import extract_table_format
+from configuration import REMOTE_OCR_ENABLED
+from adapters.infrastructure.format_converters.convert_table_to_html import (
+    extract_table_format,
+    warm_up_local_table_engines,
+)
 from adapters.infrastructure.format_converters.convert_formula_to_latex import extract_formula_format
+from adapters.infrastructure.format_converters.convert_tables_and_formulas import extract_table_and_formula_format
 
 
 class FormatConversionServiceAdapter(FormatConversionService):
+    def __init__(self):
+        # Warm up the local table engines at startup so the first request does not pay the ONNX initialization
+        if not REMOTE_OCR_ENABLED:
+            warm_up_local_table_engines()
+
     def convert_table_to_html(self, pdf_images: PdfImages, segments: list[PdfSegment]) -> None:
         extract_table_format(pdf_images, segments)
 
     def convert_formula_to_latex(self, pdf_images: PdfImages, segments: list[PdfSegment]) -> None:
         extract_formula_format(pdf_images, segments)
+
+    def convert_tables_and_formulas(
+        self, table_pdf_images: PdfImages, formula_pdf_images: PdfImages, segments: list[PdfSegment]
+    ) -> None:
+        extract_table_and_formula_format(table_pdf_images, formula_pdf_images, segments)
@@ -1,3 +1,4 @@
+from typing import Optional
 from PIL.Image import Image
 import asyncio
 from pix2tex.cli import LatexOCR
@@ -8,11 +9,18 @@ import latex2mathml.converter
 from configuration import (
     REMOTE_OCR_BASE_URL,
     REMOTE_OCR_ENABLED,
+    REMOTE_OCR_FORMULA_BATCH_SIZE,
     REMOTE_OCR_MAX_CONCURRENCY,
     REMOTE_OCR_MODEL,
     service_logger,
 )
-from adapters.infrastructure.remote_ocr.vllm_openai_client import ocr_formula_latex_async
+from adapters.infrastructure.format_converters.crop_segments import crop_segments
+from adapters.infrastructure.remote_ocr.vllm_openai_client import (
+    ocr_formula_latex_from_data_url_async,
+    ocr_formulas_latex_batch_from_data_urls_async,
+    pil_image_to_data_url,
+    run_remote_ocr,
+)
 
 
 def has_arabic(text: str) -> bool:
@@ -27,68 +35,94 @@ def is_valid_latex(formula: str) -> bool:
         return False
 
 
+def clean_remote_latex(latex: str) -> str:
+    """
+    Normalize a LaTeX answer from the remote model, or return an empty string when it is not valid LaTeX.
+    """
+    if not latex:
+        return ""
+    latex = latex.strip()
+    # tolerate servers that still return $$...$$
+    if latex.startswith("$$") and latex.endswith("$$"):
+        latex = latex[2:-2].strip()
+    if latex.startswith("\\(") and latex.endswith("\\)"):
+        latex = latex[2:-2].strip()
+    if not is_valid_latex(latex):
+        return ""
+    return latex
+
+
+def is_valid_remote_latex(latex: str) -> bool:
+    return bool(clean_remote_latex(latex))
+
+
+def set_remote_latex(formula_segment: PdfSegment, latex: str):
+    latex = clean_remote_latex(latex)
+    if not latex:
+        return
+    formula_segment.text_content = f"$${latex}$$"
+
+
+async def extract_formula_format_async(
+    pdf_images: PdfImages, formula_segments: list[PdfSegment], semaphore: Optional[asyncio.Semaphore] = None
+):
+    service_logger.info(
+        f"Remote OCR enabled: parsing {len(formula_segments)} formula segments "
+        f"via OpenAI-compatible endpoint (base_url={REMOTE_OCR_BASE_URL}, model={REMOTE_OCR_MODEL})"
+    )
+
+    semaphore = semaphore or asyncio.Semaphore(REMOTE_OCR_MAX_CONCURRENCY)
+    formula_segments = [segment for segment in formula_segments if not has_arabic(segment.text_content)]
+    formula_images: list[Image] = await asyncio.to_thread(crop_segments, pdf_images, formula_segments)
+    # Encoded once, so a failed batch retried formula by formula does not encode the crops again
+    data_urls: list[str] = await asyncio.gather(
+        *(asyncio.to_thread(pil_image_to_data_url, image) for image in formula_images)
+    )
+
+    async def _process(formula_segment: PdfSegment, data_url: str) -> None:
+        try:
+            async with semaphore:
+                latex = await ocr_formula_latex_from_data_url_async(data_url, is_valid=is_valid_remote_latex)
+            set_remote_latex(formula_segment, latex)
+        except Exception as e:
+            service_logger.warning(f"Remote formula OCR failed: {e}")
+            return
+
+    async def _process_batch(batch: list[tuple[PdfSegment, str]]) -> None:
+        try:
+            async with semaphore:
+                latex_list = await ocr_formulas_latex_batch_from_data_urls_async([data_url for _, data_url in batch])
+        except Exception as e:
+            # A malformed or partial batch answer is retried one formula per request
+            service_logger.warning(f"Remote formula batch OCR failed, retrying formulas one by one: {e}")
+            await asyncio.gather(*(_process(seg, data_url) for seg, data_url in batch))
+            return
+        for (formula_segment, _), latex in zip(batch, latex_list):
+            set_remote_latex(formula_segment, latex)
+
+    pairs = list(zip(formula_segments, data_urls))
+    if REMOTE_OCR_FORMULA_BATCH_SIZE > 1:
+        batches = [pairs[i : i + REMOTE_OCR_FORMULA_BATCH_SIZE] for i in range(0, len(pairs), REMOTE_OCR_FORMULA_BATCH_SIZE)]
+        await asyncio.gather(*(_process_batch(batch) for batch in batches))
+        return
+
+    await asyncio.gather(*(_process(seg, data_url) for seg, data_url in pairs))
+
+
 def extract_formula_format(pdf_images: PdfImages, predicted_segments: list[PdfSegment]):
     formula_segments = [segment for segment in predicted_segments if segment.segment_type == TokenType.FORMULA]
     if not formula_segments:
         return
 
     if REMOTE_OCR_ENABLED:
-        service_logger.info(
-            f"Remote OCR enabled: parsing {len(formula_segments)} formula segments "
-            f"via OpenAI-compatible endpoint (base_url={REMOTE_OCR_BASE_URL}, model={REMOTE_OCR_MODEL})"
-        )
-
-        async def _run() -> None:
-            semaphore = asyncio.Semaphore(REMOTE_OCR_MAX_CONCURRENCY)
-
-            async def _process(formula_segment: PdfSegment) -> None:
-                if has_arabic(formula_segment.text_content):
-                    return
-                try:
-                    page_image: Image = pdf_images.pdf_images[formula_segment.page_number - 1]
-                    left, top = formula_segment.bounding_box.left, formula_segment.bounding_box.top
-                    right, bottom = formula_segment.bounding_box.right, formula_segment.bounding_box.bottom
-                    left = int(left * pdf_images.dpi / 72)
-                    top = int(top * pdf_images.dpi / 72)
-                    right = int(right * pdf_images.dpi / 72)
-                    bottom = int(bottom * pdf_images.dpi / 72)
-                    formula_image = page_image.crop((left, top, right, bottom))
-                    async with semaphore:
-                        latex = await ocr_formula_latex_async(formula_image)
-                    if not latex:
-                        return
-                    latex = latex.strip()
-                    # tolerate servers that still return $$...$$
-                    if latex.startswith("$$") and latex.endswith("$$"):
-                        latex = latex[2:-2].strip()
-                    if latex.startswith("\\(") and latex.endswith("\\)"):
-                        latex = latex[2:-2].strip()
-                    if not is_valid_latex(latex):
-                        return
-                    formula_segment.text_content = f"$${latex}$$"
-                except Exception as e:
-                    service_logger.warning(f"Remote formula OCR failed: {e}")
-                    return
-
-            await asyncio.gather(*(_process(seg) for seg in formula_segments))
-
-        asyncio.run(_run())
+        run_remote_ocr(extract_formula_format_async(pdf_images, formula_segments))
         return
 
     model = LatexOCR()
     model.args.temperature = 1e-8
 
-    for formula_segment in formula_segments:
-        if has_arabic(formula_segment.text_content):
-            continue
-        page_image: Image = pdf_images.pdf_images[formula_segment.page_number - 1]
-        left, top = formula_segment.bounding_box.left, formula_segment.bounding_box.top
-        right, bottom = formula_segment.bounding_box.right, formula_segment.bounding_box.bottom
-        left = int(left * pdf_images.dpi / 72)
-        top = int(top * pdf_images.dpi / 72)
-        right = int(right * pdf_images.dpi / 72)
-        bottom = int(bottom * pdf_images.dpi / 72)
-        formula_image = page_image.crop((left, top, right, bottom))
+    formula_segments = [segment for segment in formula_segments if not has_arabic(segment.text_content)]
+    for formula_segment, formula_image in zip(formula_segments, crop_segments(pdf_images, formula_segments)):
         formula_result = model(formula_image)
         if not is_valid_latex(formula_result):
             continue
@@ -1,18 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from PIL import Image
 import asyncio
+import threading
 from domain.PdfImages import PdfImages
 from domain.PdfSegment import PdfSegment
 from pdf_token_type_labels import TokenType
 from rapidocr import RapidOCR
 from rapid_table import ModelType, RapidTable, RapidTableInput
 from configuration import (
+    LOCAL_TABLE_OCR_WORKERS,
     REMOTE_OCR_BASE_URL,
     REMOTE_OCR_ENABLED,
     REMOTE_OCR_MAX_CONCURRENCY,
     REMOTE_OCR_MODEL,
     service_logger,
 )
-from adapters.infrastructure.remote_ocr.vllm_openai_client import ocr_table_html_async
+from adapters.infrastructure.format_converters.crop_segments import crop_segments
+from adapters.infrastructure.remote_ocr.vllm_openai_client import ocr_table_html_async, run_remote_ocr
+
+
+# Each worker owns one engine pair with single-threaded ONNX sessions, so workers do not oversubscribe the CPU
+_SINGLE_THREAD_ONNX = {"intra_op_num_threads": 1, "inter_op_num_threads": 1}
+_local_table_engines = threading.local()
+_local_table_executor = ThreadPoolExecutor(max_workers=LOCAL_TABLE_OCR_WORKERS, thread_name_prefix="local-table-ocr")
+
+
+def get_local_table_engines() -> tuple[RapidOCR, RapidTable]:
+    # ONNX sessions are expensive to create, so they are reused across requests; RapidOCR keeps per-call state
+    # on the engine (preprocess_op, box_thresh), hence one pair per thread instead of one per process
+    engines = getattr(_local_table_engines, "engines", None)
+    if engines is None:
+        # RapidTable gets the OCR results from us, so its own embedded RapidOCR is not built
+        ocr_params = {f"EngineConfig.onnxruntime.{key}": value for key, value in _SINGLE_THREAD_ONNX.items()}
+        table_input = RapidTableInput(model_type=ModelType["SLANETPLUS"], engine_cfg=_SINGLE_THREAD_ONNX, use_ocr=False)
+        engines = RapidOCR(params=ocr_params), RapidTable(table_input)
+        _local_table_engines.engines = engines
+    return engines
+
+
+def warm_up_local_table_engines() -> None:
+    # One worker builds its pair up front; the other workers build theirs on first use, so idle deployments stay small.
+    # A model that fails to load only fails table requests, as it did before the warm-up
+    try:
+        _local_table_executor.submit(get_local_table_engines).result()
+    except Exception as e:
+        service_logger.warning(f"Local table engines warm-up failed: {e}")
+
+
+def recognize_table_locally(table_image: Image) -> Optional[str]:
+    ocr_engine, table_engine = get_local_table_engines()
+    ori_ocr_res = ocr_engine(table_image)
+    if not ori_ocr_res.txts:
+        return None
+    ocr_results = [ori_ocr_res.boxes, ori_ocr_res.txts, ori_ocr_res.scores]
+    return table_engine(table_image, ocr_results=ocr_results).pred_html
+
+
+def is_html_table(html: str) -> bool:
+    lowered_html = html.lower()
+    return "<table" in lowered_html or "<tr" in lowered_html
+
+
+async def extract_table_format_async(
+    pdf_images: PdfImages, table_segments: list[PdfSegment], semaphore: Optional[asyncio.Semaphore] = None
+):
+    service_logger.info(
+        f"Remote OCR enabled: parsing {len(table_segments)} table segments "
+        f"via OpenAI-compatible endpoint (base_url={REMOTE_OCR_BASE_URL}, model={REMOTE_OCR_MODEL})"
+    )
+
+    semaphore = semaphore or asyncio.Semaphore(REMOTE_OCR_MAX_CONCURRENCY)
+    table_images: list[Image] = await asyncio.to_thread(crop_segments, pdf_images, table_segments)
+
+    async def _process(table_image: Image) -> str:
+        async with semaphore:
+            return await ocr_table_html_async(table_image, is_valid=is_html_table)
+
+    results = await asyncio.gather(*(_process(image) for image in table_images), return_exceptions=True)
+    for table_segment, html in zip(table_segments, results):
+        if isinstance(html, BaseException):
+            service_logger.warning(f"Remote table OCR failed: {html}")
+            continue
+        # Keep the extracted text when the model answered with something other than a table
+        if html and is_html_table(html):
+            table_segment.text_content = html
 
 
 def extract_table_format(pdf_images: PdfImages, predicted_segments: list[PdfSegment]):
@@ -21,55 +93,11 @@ def extract_table_format(pdf_images: PdfImages, predicted_segments: list[PdfSegm
         return
 
     if REMOTE_OCR_ENABLED:
-        service_logger.info(
-            f"Remote OCR enabled: parsing {len(table_segments)} table segments "
-            f"via OpenAI-compatible endpoint (base_url={REMOTE_OCR_BASE_URL}, model={REMOTE_OCR_MODEL})"
-        )
-
-        async def _run() -> None:
-            semaphore = asyncio.Semaphore(REMOTE_OCR_MAX_CONCURRENCY)
-
-            async def _process(table_segment: PdfSegment) -> None:
-                try:
-                    page_image: Image = pdf_images.pdf_images[table_segment.page_number - 1]
-                    left, top = table_segment.bounding_box.left, table_segment.bounding_box.top
-                    right, bottom = table_segment.bounding_box.right, table_segment.bounding_box.bottom
-                    left = int(left * pdf_images.dpi / 72)
-                    top = int(top * pdf_images.dpi / 72)
-                    right = int(right * pdf_images.dpi / 72)
-                    bottom = int(bottom * pdf_images.dpi / 72)
-                    table_image = page_image.crop((left, top, right, bottom))
-                    async with semaphore:
-                        html = await ocr_table_html_async(table_image)
-                    if not html:
-                        return
-                    table_segment.text_content = html
-                except Exception as e:
-                    service_logger.warning(f"Remote table OCR failed: {e}")
-                    return
-
-            await asyncio.gather(*(_process(seg) for seg in table_segments))
-
-        asyncio.run(_run())
+        run_remote_ocr(extract_table_format_async(pdf_images, table_segments))
         return
 
-    input_args = RapidTableInput(model_type=ModelType["SLANETPLUS"])
-
-    ocr_engine = RapidOCR()
-    table_engine = RapidTable(input_args)
-
-    for table_segment in table_segments:
-        page_image: Image = pdf_images.pdf_images[table_segment.page_number - 1]
-        left, top = table_segment.bounding_box.left, table_segment.bounding_box.top
-        right, bottom = table_segment.bounding_box.right, table_segment.bounding_box.bottom
-        left = int(left * pdf_images.dpi / 72)
-        top = int(top * pdf_images.dpi / 72)
-        right = int(right * pdf_images.dpi / 72)
-        bottom = int(bottom * pdf_images.dpi / 72)
-        table_image = page_image.crop((left, top, right, bottom))
-        ori_ocr_res = ocr_engine(table_image)
-        if not ori_ocr_res.txts:
-            continue
-        ocr_results = [ori_ocr_res.boxes, ori_ocr_res.txts, ori_ocr_res.scores]
-        table_result = table_engine(table_image, ocr_results=ocr_results)
-        table_segment.text_content = table_result.pred_html
+    table_images: list[Image] = crop_segments(pdf_images, table_segments)
+    # ONNX Runtime releases the GIL during inference, so crops run concurrently, each on its worker's own engines
+    for table_segment, html in zip(table_segments, _local_table_executor.map(recognize_table_locally, table_images)):
+        if html is not None:
+            table_segment.text_content = html
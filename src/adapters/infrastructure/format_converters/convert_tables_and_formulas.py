@@ -0,0 +1,38 @@
+import asyncio
+from domain.PdfImages import PdfImages
+from domain.PdfSegment import PdfSegment
+from pdf_token_type_labels import TokenType
+from configuration import REMOTE_OCR_ENABLED, REMOTE_OCR_MAX_CONCURRENCY
+from adapters.infrastructure.format_converters.convert_formula_to_latex import (
+    extract_formula_format,
+    extract_formula_format_async,
+)
+from adapters.infrastructure.format_converters.convert_table_to_html import extract_table_format, extract_table_format_async
+from adapters.infrastructure.remote_ocr.vllm_openai_client import run_remote_ocr
+
+
+async def extract_table_and_formula_format_async(
+    table_pdf_images: PdfImages, formula_pdf_images: PdfImages, predicted_segments: list[PdfSegment]
+):
+    table_segments = [segment for segment in predicted_segments if segment.segment_type == TokenType.TABLE]
+    formula_segments = [segment for segment in predicted_segments if segment.segment_type == TokenType.FORMULA]
+
+    # One semaphore for both kinds keeps the endpoint saturated without exceeding the configured concurrency
+    semaphore = asyncio.Semaphore(REMOTE_OCR_MAX_CONCURRENCY)
+    tasks = []
+    if formula_segments:
+        tasks.append(extract_formula_format_async(formula_pdf_images, formula_segments, semaphore))
+    if table_segments:
+        tasks.append(extract_table_format_async(table_pdf_images, table_segments, semaphore))
+    await asyncio.gather(*tasks)
+
+
+def extract_table_and_formula_format(
+    table_pdf_images: PdfImages, formula_pdf_images: PdfImages, predicted_segments: list[PdfSegment]
+):
+    if REMOTE_OCR_ENABLED:
+        run_remote_ocr(extract_table_and_formula_format_async(table_pdf_images, formula_pdf_images, predicted_segments))
+        return
+
+    extract_formula_format(formula_pdf_images, predicted_segments)
+    extract_table_format(table_pdf_images, predicted_segments)
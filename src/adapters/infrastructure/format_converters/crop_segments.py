@@ -0,0 +1,20 @@
+import numpy as np
+from PIL.Image import Image
+from domain.PdfImages import PdfImages
+from domain.PdfSegment import PdfSegment
+
+
+def get_pixel_boxes(segments: list[PdfSegment], dpi: int) -> np.ndarray:
+    points = np.array(
+        [(s.bounding_box.left, s.bounding_box.top, s.bounding_box.right, s.bounding_box.bottom) for s in segments],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    return (points * dpi / 72).astype(np.int32)
+
+
+def crop_segments(pdf_images: PdfImages, segments: list[PdfSegment]) -> list[Image]:
+    pixel_boxes = get_pixel_boxes(segments, pdf_images.dpi)
+    return [
+        pdf_images.pdf_images[segment.page_number - 1].crop(tuple(box.tolist()))
+        for segment, box in zip(segments, pixel_boxes)
+    ]
@@ -1,14 +1,17 @@
+import subprocess
+from bisect import bisect_left, bisect_right
 import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import zipfile
 import io
-import json
 from pathlib import Path
-from typing import Optional, Union
-from PIL.Image import Image
-from pdf2image import convert_from_path
-from starlette.responses import Response
+from typing import Iterator, Optional, Union
+import numpy as np
+import orjson
+from starlette.responses import Response, StreamingResponse
 
-from configuration import service_logger
+from configuration import PICTURE_IMAGE_FORMAT, PICTURE_JPEG_QUALITY, TRANSLATION_WORKERS, service_logger
 from domain.SegmentBox import SegmentBox
 from domain.pdf_features_loader import load_pdf_features
 from pdf_features.PdfFeatures import PdfFeatures
@@ -24,6 +27,26 @@ from adapters.infrastructure.markup_conversion.ExtractedImage import ExtractedIm
 from adapters.infrastructure.translation.ollama_container_manager import OllamaContainerManager
 from adapters.infrastructure.translation.translate_markup_document import translate_markup
 
+PICTURE_IMAGE_EXTENSION = "jpg" if PICTURE_IMAGE_FORMAT == "jpeg" else "png"
+ALREADY_COMPRESSED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".zip"}
+
+
+class _ZipChunkStream(io.RawIOBase):
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
 
 class PdfToMarkupServiceAdapter:
     def __init__(self, output_format: OutputFormat):
@@ -74,43 +97,61 @@ class PdfToMarkupServiceAdapter:
         segments: list[SegmentBox],
         translations: Optional[dict[str, str]] = None,
     ) -> Response:
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            zip_file.writestr(output_filename, content.encode("utf-8"))
-
-            if extracted_images:
-                base_name = Path(output_filename).stem
-                pictures_dir = f"{base_name}_pictures/"
-
-                for image in extracted_images:
-                    zip_file.writestr(f"{pictures_dir}{image.filename}", image.image_data)
-
-            if translations:
-                output_path = Path(output_filename)
-                for language, translated_content in translations.items():
-                    translated_filename = f"{output_path.stem}_{language}{output_path.suffix}"
-                    zip_file.writestr(translated_filename, translated_content.encode("utf-8"))
-
-            base_name = Path(output_filename).stem
-            segmentation_filename = f"{base_name}_segmentation.json"
-            segmentation_data = self._create_segmentation_json(segments)
-            zip_file.writestr(segmentation_filename, segmentation_data)
-
-        zip_buffer.seek(0)
-
+        # Everything that can fail is encoded before the response starts, so errors still surface as an error status
+        # instead of a truncated archive sent with 200
+        entries = self._create_zip_entries(content, extracted_images, output_filename, segments, translations)
         zip_filename = f"{Path(output_filename).stem}.zip"
-        return Response(
-            content=zip_buffer.getvalue(),
+        return StreamingResponse(
+            self._iterate_zip_chunks(entries),
             media_type="application/zip",
             headers={"Content-Disposition": f"attachment; filename={zip_filename}"},
         )
 
-    def _create_segmentation_json(self, segments: list[SegmentBox]) -> str:
-        segmentation_data = []
-        for segment in segments:
-            segmentation_data.append(segment.to_dict())
-        return json.dumps(segmentation_data, indent=4, ensure_ascii=False)
+    def _create_zip_entries(
+        self,
+        content: str,
+        extracted_images: list[ExtractedImage],
+        output_filename: str,
+        segments: list[SegmentBox],
+        translations: Optional[dict[str, str]] = None,
+    ) -> list[tuple[str, bytes]]:
+        entries = [(output_filename, content.encode("utf-8"))]
+        base_name = Path(output_filename).stem
+
+        if extracted_images:
+            pictures_dir = f"{base_name}_pictures/"
+            entries.extend((f"{pictures_dir}{image.filename}", image.image_data) for image in extracted_images)
+
+        if translations:
+            output_path = Path(output_filename)
+            for language, translated_content in translations.items():
+                translated_filename = f"{output_path.stem}_{language}{output_path.suffix}"
+                entries.append((translated_filename, translated_content.encode("utf-8")))
+
+        entries.append((f"{base_name}_segmentation.json", self._create_segmentation_json(segments)))
+        return entries
+
+    def _iterate_zip_chunks(self, entries: list[tuple[str, bytes]]) -> Iterator[bytes]:
+        # Each entry is flushed to the client as soon as it is written, so the archive is never held in memory
+        stream = _ZipChunkStream()
+
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as zip_file:
+            for filename, data in entries:
+                self._write_zip_entry(zip_file, filename, data)
+                yield stream.pop()
+
+        yield stream.pop()
+
+    @staticmethod
+    def _write_zip_entry(zip_file: zipfile.ZipFile, filename: str, data: bytes):
+        # Already compressed formats do not shrink under DEFLATE, so they are stored as is
+        if Path(filename).suffix.lower() in ALREADY_COMPRESSED_EXTENSIONS:
+            zip_file.writestr(filename, data, compress_type=zipfile.ZIP_STORED)
+        else:
+            zip_file.writestr(filename, data)
+
+    def _create_segmentation_json(self, segments: list[SegmentBox]) -> bytes:
+        return orjson.dumps([segment.to_dict() for segment in segments], option=orjson.OPT_INDENT_2)
 
     def _generate_translations(
         self,
@@ -126,20 +167,29 @@ class PdfToMarkupServiceAdapter:
         if not ollama_manager.ensure_service_ready(translation_model):
             return translations
 
-        for target_language in target_languages:
+        def translate(target_language: str) -> str:
             service_logger.info(f"\033[96mTranslating content to {target_language}\033[0m")
-            translated_content = translate_markup(
+            return translate_markup(
                 ollama_manager, self.output_format, segments, content_parts, translation_model, target_language, extract_toc
             )
-            translations[target_language] = translated_content
+
+        with ThreadPoolExecutor(max_workers=min(TRANSLATION_WORKERS, len(target_languages))) as executor:
+            for target_language, translated_content in zip(target_languages, executor.map(translate, target_languages)):
+                translations[target_language] = translated_content
 
         return translations
 
-    def _create_pdf_labels_from_segments(self, vgt_segments: list[SegmentBox]) -> PdfLabels:
-        page_numbers = sorted(set(segment.page_number for segment in vgt_segments))
+    @staticmethod
+    def _group_segments_by_page(vgt_segments: list[SegmentBox]) -> dict[int, list[SegmentBox]]:
+        segments_by_page: dict[int, list[SegmentBox]] = defaultdict(list)
+        for segment in vgt_segments:
+            segments_by_page[segment.page_number].append(segment)
+        return segments_by_page
+
+    def _create_pdf_labels_from_segments(self, segments_by_page: dict[int, list[SegmentBox]]) -> PdfLabels:
         page_labels: list[PageLabels] = []
-        for page_number in page_numbers:
-            segments_in_page = [s for s in vgt_segments if s.page_number == page_number]
+        for page_number in sorted(segments_by_page):
+            segments_in_page = segments_by_page[page_number]
             labels: list[Label] = []
             for segment in segments_in_page:
                 rect = Rectangle.from_width_height(segment.left, segment.top, segment.width, segment.height)
@@ -151,7 +201,6 @@ class PdfToMarkupServiceAdapter:
     def _process_picture_segment(
         self,
         segment: SegmentBox,
-        pdf_images: list[Image],
         pdf_path: Path,
         picture_id: int,
         dpi: int = 72,
@@ -163,23 +212,32 @@ class PdfToMarkupServiceAdapter:
             return ""
 
         segment_box = Rectangle.from_width_height(segment.left, segment.top, segment.width, segment.height)
-        image = pdf_images[segment.page_number - 1]
         left, top, right, bottom = segment_box.left, segment_box.top, segment_box.right, segment_box.bottom
         if dpi != 72:
             left = left * dpi / 72
             top = top * dpi / 72
             right = right * dpi / 72
             bottom = bottom * dpi / 72
-        cropped = image.crop((left, top, right, bottom))
+        image_data = self._render_region(pdf_path, segment.page_number, dpi, (left, top, right, bottom))
 
         base_name = user_base_name if user_base_name else pdf_path.stem
-        image_name = f"{base_name}_{segment.page_number}_{picture_id}.png"
+        image_name = f"{base_name}_{segment.page_number}_{picture_id}.{PICTURE_IMAGE_EXTENSION}"
 
-        img_buffer = io.BytesIO()
-        cropped.save(img_buffer, format="PNG")
-        extracted_images.append(ExtractedImage(image_data=img_buffer.getvalue(), filename=image_name))
+        extracted_images.append(ExtractedImage(image_data=image_data, filename=image_name))
         return f"<img src='{base_name}_pictures/{image_name}' alt=''>\n\n"
 
+    @staticmethod
+    def _render_region(pdf_path: Path, page_number: int, dpi: int, box: tuple[float, float, float, float]) -> bytes:
+        # pdftoppm rasterizes only the requested area and encodes it itself, so the pixels never go through PIL
+        left, top, right, bottom = (round(coordinate) for coordinate in box)
+        command = ["pdftoppm", "-f", str(page_number), "-l", str(page_number), "-r", str(dpi)]
+        command += ["-x", str(left), "-y", str(top), "-W", str(max(1, right - left)), "-H", str(max(1, bottom - top))]
+        if PICTURE_IMAGE_FORMAT == "jpeg":
+            command += ["-jpeg", "-jpegopt", f"quality={PICTURE_JPEG_QUALITY}"]
+        else:
+            command += ["-png"]
+        return subprocess.run(command + [str(pdf_path)], capture_output=True, check=True).stdout
+
     def _process_table_segment(self, segment: SegmentBox) -> str:
         return segment.text + "\n\n"
 
@@ -232,6 +290,63 @@ class PdfToMarkupServiceAdapter:
         table_of_contents += "\n"
         return table_of_contents + "\n\n"
 
+    @staticmethod
+    def _get_formulas_inside_tables(segments_in_page: list[SegmentBox]) -> set[int]:
+        formula_indexes: list[int] = []
+        tables: list[SegmentBox] = []
+        for index, segment in enumerate(segments_in_page):
+            if segment.type == TokenType.FORMULA:
+                formula_indexes.append(index)
+            elif segment.type == TokenType.TABLE:
+                tables.append(segment)
+        if not formula_indexes or not tables:
+            return set()
+
+        def to_boxes(boxes: list[SegmentBox]) -> np.ndarray:
+            # Through Rectangle, so degenerate boxes are normalized exactly as in the per-pair intersection check
+            rectangles = [Rectangle.from_width_height(s.left, s.top, s.width, s.height) for s in boxes]
+            return np.array([(r.left, r.top, r.right, r.bottom) for r in rectangles], dtype=np.float64)
+
+        # Shapes (formulas, 1) against (1, tables): every formula/table pair is checked in one vectorized pass
+        formula_boxes = to_boxes([segments_in_page[index] for index in formula_indexes])[:, None, :]
+        table_boxes = to_boxes(tables)[None, :, :]
+        left, top, right, bottom = (formula_boxes[..., i] for i in range(4))
+        table_left, table_top, table_right, table_bottom = (table_boxes[..., i] for i in range(4))
+
+        # Prefer a strict, numeric criterion (intersection) and fall back to center-in-table.
+        overlap_width = np.clip(np.minimum(right, table_right) - np.maximum(left, table_left), 0, None)
+        overlap_height = np.clip(np.minimum(bottom, table_bottom) - np.maximum(top, table_top), 0, None)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            overlaps = 100 * overlap_width * overlap_height / ((right - left) * (bottom - top)) > 50
+        center_x = (left + right) / 2.0
+        center_y = (top + bottom) / 2.0
+        centers_inside = (table_left <= center_x) & (center_x <= table_right)
+        centers_inside &= (table_top <= center_y) & (center_y <= table_bottom)
+
+        inside_table = (overlaps | centers_inside).any(axis=1)
+        return {index for index, inside in zip(formula_indexes, inside_table) if inside}
+
+    @staticmethod
+    def _index_tokens_by_top(tokens: list[PdfToken]) -> tuple[list[float], list[int], float]:
+        order = sorted(range(len(tokens)), key=lambda index: tokens[index].bounding_box.top)
+        tops = [tokens[index].bounding_box.top for index in order]
+        max_height = max((token.bounding_box.height for token in tokens), default=0)
+        return tops, order, max_height
+
+    @staticmethod
+    def _get_tokens_in_segment(
+        tokens: list[PdfToken], token_index: tuple[list[float], list[int], float], seg_box: Rectangle
+    ) -> list[PdfToken]:
+        tops, order, max_height = token_index
+        # Only tokens overlapping the segment vertically can pass the 50% check, and none of them can start
+        # more than one token height above it
+        start = bisect_left(tops, seg_box.top - max_height)
+        end = bisect_right(tops, seg_box.bottom)
+        candidates = sorted(order[start:end])
+        return [
+            tokens[index] for index in candidates if tokens[index].bounding_box.get_intersection_percentage(seg_box) > 50
+        ]
+
     def _get_styled_content_parts(
         self,
         pdf_path: Path,
@@ -241,7 +356,8 @@ class PdfToMarkupServiceAdapter:
         extracted_images: Optional[list[ExtractedImage]] = None,
         user_base_name: Optional[str] = None,
     ) -> str:
-        pdf_labels: PdfLabels = self._create_pdf_labels_from_segments(vgt_segments)
+        segments_by_page = self._group_segments_by_page(vgt_segments)
+        pdf_labels: PdfLabels = self._create_pdf_labels_from_segments(segments_by_page)
         pdf_features: PdfFeatures = load_pdf_features(pdf_path)
         pdf_features.set_token_types(pdf_labels)
         pdf_features.set_token_styles()
@@ -250,26 +366,18 @@ class PdfToMarkupServiceAdapter:
         if extract_toc:
             content_parts.append(self._get_table_of_contents(vgt_segments))
 
-        picture_segments = [s for s in vgt_segments if s.type == TokenType.PICTURE]
-        pdf_images: list[Image] = convert_from_path(pdf_path, dpi=dpi) if picture_segments else []
-
         for page in pdf_features.pages:
-            segments_in_page = [s for s in vgt_segments if s.page_number == page.page_number]
-            table_boxes_in_page = [
-                Rectangle.from_width_height(s.left, s.top, s.width, s.height)
-                for s in segments_in_page
-                if s.type == TokenType.TABLE
-            ]
+            segments_in_page = segments_by_page.get(page.page_number, [])
+            formulas_inside_tables = self._get_formulas_inside_tables(segments_in_page)
+            token_index = self._index_tokens_by_top(page.tokens)
             picture_id = 0
-            for segment in segments_in_page:
+            for segment_index, segment in enumerate(segments_in_page):
                 seg_box = Rectangle.from_width_height(segment.left, segment.top, segment.width, segment.height)
-                tokens_in_seg = [t for t in page.tokens if t.bounding_box.get_intersection_percentage(seg_box) > 50]
+                tokens_in_seg = self._get_tokens_in_segment(page.tokens, token_index, seg_box)
 
                 if segment.type == TokenType.PICTURE:
                     content_parts.append(
-                        self._process_picture_segment(
-                            segment, pdf_images, pdf_path, picture_id, dpi, extracted_images, user_base_name
-                        )
+                        self._process_picture_segment(segment, pdf_path, picture_id, dpi, extracted_images, user_base_name)
                     )
                     picture_id += 1
                 elif segment.type == TokenType.TABLE:
@@ -279,19 +387,10 @@ class PdfToMarkupServiceAdapter:
                 elif segment.type == TokenType.FORMULA:
                     # If the formula is inside a table region, skip it here to avoid
                     # duplicating content: the table HTML already contains the LaTeX via markers replacement.
-                    if table_boxes_in_page:
-                        # Prefer a strict, numeric criterion (intersection) and fall back to center-in-table.
-                        inside_table = any(seg_box.get_intersection_percentage(tb) > 50 for tb in table_boxes_in_page)
-                        if not inside_table:
-                            cx = (seg_box.left + seg_box.right) / 2.0
-                            cy = (seg_box.top + seg_box.bottom) / 2.0
-                            inside_table = any((tb.left <= cx <= tb.right) and (tb.top <= cy <= tb.bottom) for tb in table_boxes_in_page)
-                        if inside_table:
-                            continue
+                    if segment_index in formulas_inside_tables:
+                        continue
                     content_parts.append(segment.text + "\n\n")
                 else:
-                    content_parts.append(
-                        self._process_regular_segment(tokens_in_seg, segment)
-                    )
+                    content_parts.append(self._process_regular_segment(tokens_in_seg, segment))
 
         return content_parts
@@ -1,11 +1,17 @@
-from typing import AnyStr
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import AnyStr, Optional
+from pdf2image import convert_from_path
+from PIL.Image import Image
 from domain.PdfImages import PdfImages
 from domain.SegmentBox import SegmentBox
 from ports.services.pdf_analysis_service import PDFAnalysisService
 from ports.services.ml_model_service import MLModelService
 from ports.services.format_conversion_service import FormatConversionService
 from ports.repositories.file_repository import FileRepository
-from configuration import service_logger
+from configuration import PAGE_RENDER_WORKERS, service_logger
+
+_RENDER_CHUNK_PAGES = 8
 
 
 class PDFAnalysisServiceAdapter(PDFAnalysisService):
@@ -28,17 +34,26 @@ class PDFAnalysisServiceAdapter(PDFAnalysisService):
         service_logger.info("Creating PDF images")
 
         pdf_images_list: list[PdfImages] = [PdfImages.from_pdf_path(pdf_path, "", xml_filename)]
+        pages_200_dpi = (
+            self._render_pages_in_background(pdf_path, 200, pdf_images_list[0]) if parse_tables_and_math else None
+        )
+
+        try:
+            predicted_segments = self.vgt_model_service.predict_document_layout(pdf_images_list)
 
-        predicted_segments = self.vgt_model_service.predict_document_layout(pdf_images_list)
+            if predicted_segments:
+                service_logger.info(f"Predicted {len(predicted_segments)} segments")
 
-        if predicted_segments:
-            service_logger.info(f"Predicted {len(predicted_segments)} segments")
+            if parse_tables_and_math:
+                service_logger.info("Parsing tables and formulas")
+                pdf_images_200_dpi = self._get_rendered_pdf_images(pdf_images_list[0], pages_200_dpi, 200)
+        finally:
+            self._cancel_render(pages_200_dpi)
 
         if parse_tables_and_math:
-            service_logger.info("Parsing tables and formulas")
-            pdf_images_200_dpi = PdfImages.from_pdf_path(pdf_path, "", xml_filename, dpi=200)
-            self.format_conversion_service.convert_formula_to_latex(pdf_images_200_dpi, predicted_segments)
-            self.format_conversion_service.convert_table_to_html(pdf_images_200_dpi, predicted_segments)
+            self.format_conversion_service.convert_tables_and_formulas(
+                pdf_images_200_dpi, pdf_images_200_dpi, predicted_segments
+            )
 
         if not keep_pdf:
             self.file_repository.delete_file(pdf_path)
@@ -55,13 +70,21 @@ class PDFAnalysisServiceAdapter(PDFAnalysisService):
         service_logger.info("Creating PDF images for fast analysis")
 
         pdf_images_list: list[PdfImages] = [PdfImages.from_pdf_path(pdf_path, "", xml_filename)]
+        pages_200_dpi = (
+            self._render_pages_in_background(pdf_path, 200, pdf_images_list[0]) if parse_tables_and_math else None
+        )
 
-        predicted_segments = self.fast_model_service.predict_layout_fast(pdf_images_list)
+        try:
+            predicted_segments = self.fast_model_service.predict_layout_fast(pdf_images_list)
+            if parse_tables_and_math:
+                pdf_images_200_dpi = self._get_rendered_pdf_images(pdf_images_list[0], pages_200_dpi, 200)
+        finally:
+            self._cancel_render(pages_200_dpi)
 
         if parse_tables_and_math:
-            pdf_images_200_dpi = PdfImages.from_pdf_path(pdf_path, "", xml_filename, dpi=200)
-            self.format_conversion_service.convert_formula_to_latex(pdf_images_200_dpi, predicted_segments)
-            self.format_conversion_service.convert_table_to_html(pdf_images_list[0], predicted_segments)
+            self.format_conversion_service.convert_tables_and_formulas(
+                pdf_images_list[0], pdf_images_200_dpi, predicted_segments
+            )
 
         if not keep_pdf:
             self.file_repository.delete_file(pdf_path)
@@ -70,3 +93,35 @@ class PDFAnalysisServiceAdapter(PDFAnalysisService):
             SegmentBox.from_pdf_segment(pdf_segment, pdf_images_list[0].pdf_features.pages).to_dict()
             for pdf_segment in predicted_segments
         ]
+
+    @staticmethod
+    def _render_pages_in_background(pdf_path: str | Path, dpi: int, pdf_images: PdfImages) -> list[Future]:
+        # Rasterization runs in pdftoppm, so it overlaps with layout prediction instead of following it.
+        # Pages are rendered in ranges, so a failed request only finishes the ranges already running.
+        # Each request owns its workers, so a long document never queues ahead of another request's pages
+        page_count = len(pdf_images.pdf_images)
+        executor = ThreadPoolExecutor(max_workers=PAGE_RENDER_WORKERS, thread_name_prefix="page-render")
+        rendered_pages = [
+            executor.submit(
+                convert_from_path,
+                pdf_path,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=min(first_page + _RENDER_CHUNK_PAGES - 1, page_count),
+            )
+            for first_page in range(1, page_count + 1, _RENDER_CHUNK_PAGES)
+        ]
+        # The workers exit once the submitted ranges are rendered or cancelled
+        executor.shutdown(wait=False)
+        return rendered_pages
+
+    @staticmethod
+    def _cancel_render(rendered_pages: Optional[list[Future]]) -> None:
+        # No-op once the pages are rendered; on the error path the queued ranges are skipped
+        for rendered_range in rendered_pages or []:
+            rendered_range.cancel()
+
+    @staticmethod
+    def _get_rendered_pdf_images(pdf_images: PdfImages, rendered_pages: list[Future], dpi: int) -> PdfImages:
+        pages: list[Image] = [page for rendered_range in rendered_pages for page in rendered_range.result()]
+        return PdfImages(pdf_images.pdf_features, pages, dpi, save_to_disk=False)
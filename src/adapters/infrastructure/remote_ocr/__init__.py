@@ -1,3 +1 @@
 """Remote OCR adapters (OpenAI-compatible endpoints like vLLM)."""
-
-
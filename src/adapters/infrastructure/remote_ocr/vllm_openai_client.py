@@ -1,18 +1,35 @@
-import base64
-import io
+import asyncio
+import atexit
+import hashlib
 import logging
 import math
+import random
+import re
 import threading
-from typing import Optional
-
-from openai import AsyncOpenAI, OpenAI
-from PIL import Image
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Coroutine, Optional, TypeVar
+
+import aiohttp
+from cachetools import LRUCache, cached
+from cachetools.keys import hashkey
+import cv2
+import httpx
+import numpy as np
+import orjson
+import pybase64
+from openai import DefaultHttpxClient, OpenAI
+from PIL import Image, ImageOps
 
 from configuration import (
     REMOTE_OCR_API_KEY,
     REMOTE_OCR_BASE_URL,
+    REMOTE_OCR_IMAGE_FORMAT,
+    REMOTE_OCR_JPEG_QUALITY,
+    REMOTE_OCR_MAX_IMAGE_SIDE,
     REMOTE_OCR_MAX_IMAGE_TOKENS,
     REMOTE_OCR_MODEL,
+    REMOTE_OCR_TABLE_MAX_IMAGE_SIDE,
     REMOTE_OCR_TEMPERATURE,
     REMOTE_OCR_TIMEOUT_SEC,
 )
@@ -22,6 +39,35 @@ logger = logging.getLogger(__name__)
 
 _MIN_IMAGE_FACTOR = 32
 _VISUAL_TOKEN_PIXELS = 784  # Qwen2.5-VL: one visual token covers (patch_size * spatial_merge_size)^2 = (14*2)^2 = 784 px
+_DEFAULT_MIME = "image/png" if REMOTE_OCR_IMAGE_FORMAT == "png" else "image/jpeg"
+_DATA_URL_CACHE_CHARS = 16 * 1024 * 1024
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=100)
+_CHAT_COMPLETIONS_URL = f"{REMOTE_OCR_BASE_URL.rstrip('/')}/chat/completions"
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_TIMEOUT_GRACE_SEC = 5
+# Retry policy of the OpenAI SDK, which the aiohttp path replaces: 2 retries on connection errors and these statuses or 5xx
+_MAX_RETRIES = 2
+_RETRYABLE_STATUSES = frozenset({408, 409, 429})
+_INITIAL_RETRY_DELAY_SEC = 0.5
+_MAX_RETRY_DELAY_SEC = 8.0
+# Opening fence line (with optional language tag) and an optional closing fence at the very end
+_FENCE_RE = re.compile(r"^```[^\n]*(?:\n|$)(.*?)(?:```)?$", re.S)
+_NEWLINE_TABLE = str.maketrans({"\n": None})
+_OCR_RESULT_CACHE_SIZE = 1024
+# Characters produced by the JSON escapes \b \f \t \n \r
+_JSON_CONTROL_ESCAPES = frozenset("\b\f\t\n\r")
+_TABLE_PROMPT = (
+    "Extract the table from the image.\n"
+    "Return ONLY valid HTML for the table (prefer <table>...</table>).\n"
+    "Do NOT include markdown fences or any extra text."
+)
+_FORMULA_PROMPT = (
+    "Extract the equation from the image.\n"
+    "Return ONLY the LaTeX expression.\n"
+    "Do NOT wrap it in $$ or \\( \\). Do NOT include any extra text."
+)
+
+T = TypeVar("T")
 
 
 def _pad_to_min_size(image: Image.Image, factor: int = _MIN_IMAGE_FACTOR) -> Image.Image:
@@ -33,11 +79,11 @@ def _pad_to_min_size(image: Image.Image, factor: int = _MIN_IMAGE_FACTOR) -> Ima
     if w >= factor and h >= factor:
         return image
 
-    new_w = max(w, factor)
-    new_h = max(h, factor)
-    padded = Image.new("RGB", (new_w, new_h), (255, 255, 255))
-    padded.paste(image, (0, 0))
-    return padded
+    # Grayscale stays single-channel, other modes are flattened to RGB as pasting onto a white RGB canvas did
+    if image.mode not in {"RGB", "L"}:
+        image = image.convert("RGB")
+    fill = 255 if image.mode == "L" else (255, 255, 255)
+    return ImageOps.expand(image, border=(0, 0, max(0, factor - w), max(0, factor - h)), fill=fill)
 
 
 def _downscale_to_token_budget(image: Image.Image, max_tokens: int) -> Image.Image:
@@ -55,160 +101,405 @@ def _downscale_to_token_budget(image: Image.Image, max_tokens: int) -> Image.Ima
     resized = image.resize((new_w, new_h), Image.LANCZOS)
     logger.debug(
         "Downscaled OCR image %dx%d -> %dx%d (~%.0f -> ~%.0f visual tokens)",
-        w, h, new_w, new_h, current_tokens, (new_w * new_h) / _VISUAL_TOKEN_PIXELS,
+        w,
+        h,
+        new_w,
+        new_h,
+        current_tokens,
+        (new_w * new_h) / _VISUAL_TOKEN_PIXELS,
     )
     return resized
 
 
-def _pil_image_to_data_url(image: Image.Image, mime: str = "image/png") -> str:
+def _cap_max_side(image: Image.Image, max_side: int) -> Image.Image:
+    w, h = image.size
+    if max_side <= 0 or max(w, h) <= max_side:
+        return image
+
+    scale = max_side / max(w, h)
+    new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return image.resize(new_size, Image.LANCZOS)
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in {"RGBA", "LA", "PA"} or (image.mode == "P" and "transparency" in image.info)
+
+
+def _to_opencv_pixels(image: Image.Image, keep_alpha: bool) -> np.ndarray:
+    # RGB and grayscale crops are passed as they are, only other modes pay for a converted copy
+    if image.mode not in {"RGB", "L"}:
+        image = image.convert("RGBA" if keep_alpha else "RGB")
+    pixels = np.asarray(image)
+    if image.mode == "RGB":
+        return pixels[:, :, ::-1]
+    if image.mode == "RGBA":
+        return pixels[:, :, [2, 1, 0, 3]]
+    return pixels
+
+
+def _encode_image(image: Image.Image, mime: str) -> np.ndarray:
+    # OpenCV (libjpeg-turbo / libpng) encodes into a single numpy buffer, no BytesIO round trip through Pillow
+    if mime == "image/jpeg":
+        pixels = _to_opencv_pixels(image, keep_alpha=False)
+        return cv2.imencode(".jpg", pixels, [cv2.IMWRITE_JPEG_QUALITY, REMOTE_OCR_JPEG_QUALITY])[1]
+    return cv2.imencode(".png", _to_opencv_pixels(image, keep_alpha=True))[1]
+
+
+def _data_url_cache_key(
+    image: Image.Image, mime: str = _DEFAULT_MIME, pad_min: bool = True, max_side: int = REMOTE_OCR_MAX_IMAGE_SIDE
+) -> tuple:
+    # Keyed by content rather than identity, so a crop that is cut again still hits the cache. Python's built-in bytes
+    # hash (64-bit SipHash, randomly keyed per process) costs a third of blake2b on a page-wide crop, and every miss pays it
+    palette = (bytes(image.getpalette() or []), image.info.get("transparency")) if image.mode == "P" else None
+    return hashkey(image.size, image.mode, mime, pad_min, max_side, hash(image.tobytes()), palette)
+
+
+@cached(LRUCache(maxsize=_DATA_URL_CACHE_CHARS, getsizeof=len), key=_data_url_cache_key, lock=threading.Lock())
+def pil_image_to_data_url(
+    image: Image.Image, mime: str = _DEFAULT_MIME, pad_min: bool = True, max_side: int = REMOTE_OCR_MAX_IMAGE_SIDE
+) -> str:
     """
     Convert PIL image into a data URL for OpenAI-compatible 'image_url' inputs.
-    Large images are downscaled to fit REMOTE_OCR_MAX_IMAGE_TOKENS;
-    small images are padded with white to satisfy minimum size requirements.
+    Large images are downscaled to fit REMOTE_OCR_MAX_IMAGE_TOKENS and a longest side of max_side (0 disables),
+    which defaults to REMOTE_OCR_MAX_IMAGE_SIDE (table OCR passes REMOTE_OCR_TABLE_MAX_IMAGE_SIDE);
+    small images are padded with white to satisfy minimum size requirements (disable with pad_min=False).
+    JPEG is used by default (REMOTE_OCR_IMAGE_FORMAT) since it shrinks the upload several times;
+    images with transparency fall back to PNG.
     """
     image = _downscale_to_token_budget(image, REMOTE_OCR_MAX_IMAGE_TOKENS)
-    image = _pad_to_min_size(image)
+    image = _cap_max_side(image, max_side)
+    if pad_min:
+        image = _pad_to_min_size(image)
 
-    if mime not in {"image/png", "image/jpeg"}:
+    if mime not in {"image/png", "image/jpeg"} or _has_alpha(image):
         mime = "image/png"
 
-    buf = io.BytesIO()
-    if mime == "image/jpeg":
-        image.convert("RGB").save(buf, format="JPEG", quality=95)
-    else:
-        image.save(buf, format="PNG")
-    b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+    # pybase64 uses SIMD kernels and returns the str directly, without an intermediate bytes object
+    return f"data:{mime};base64,{pybase64.b64encode_as_string(_encode_image(image, mime))}"
 
 
+@lru_cache(maxsize=1)
 def _get_client() -> OpenAI:
     # OpenAI-compatible endpoints (e.g. vLLM or OpenRouter). Some servers are API-key agnostic,
     # but the SDK still requires a value.
-    return OpenAI(api_key=REMOTE_OCR_API_KEY, base_url=REMOTE_OCR_BASE_URL, timeout=REMOTE_OCR_TIMEOUT_SEC)
+    # A single client keeps its connection pool alive, so calls reuse TCP/TLS sessions instead of reconnecting.
+    return OpenAI(
+        api_key=REMOTE_OCR_API_KEY,
+        base_url=REMOTE_OCR_BASE_URL,
+        timeout=REMOTE_OCR_TIMEOUT_SEC,
+        http_client=DefaultHttpxClient(limits=_HTTP_LIMITS),
+    )
 
 
-_thread_local = threading.local()
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+_async_session: Optional[aiohttp.ClientSession] = None
 
 
-def _get_async_client() -> AsyncOpenAI:
-    # OpenAI-compatible endpoints (e.g. vLLM or OpenRouter). Some servers are API-key agnostic,
-    # but the SDK still requires a value.
-    client = getattr(_thread_local, "async_client", None)
-    if client is None:
-        client = AsyncOpenAI(api_key=REMOTE_OCR_API_KEY, base_url=REMOTE_OCR_BASE_URL, timeout=REMOTE_OCR_TIMEOUT_SEC)
-        _thread_local.async_client = client
-    return client
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    # One long-lived loop serves every request, so the HTTP pool and its keep-alive sockets survive between documents
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="remote-ocr-loop", daemon=True).start()
+            atexit.register(_shutdown_background_loop)
+    return _background_loop
+
+
+def _get_async_session() -> aiohttp.ClientSession:
+    # Only touched from the background loop, so no locking is needed.
+    # The pool is unbounded: concurrency is capped by each document's semaphore, and a shared connection cap would
+    # make requests queue for a socket inside their own timeout
+    global _async_session
+    if _async_session is None or _async_session.closed:
+        _async_session = aiohttp.ClientSession(
+            headers={"Authorization": f"Bearer {REMOTE_OCR_API_KEY}"},
+            connector=aiohttp.TCPConnector(limit=0),
+            timeout=aiohttp.ClientTimeout(total=REMOTE_OCR_TIMEOUT_SEC),
+        )
+    return _async_session
 
 
-def _strip_code_fences(text: str) -> str:
+async def _close_async_session() -> None:
+    if _async_session is not None:
+        await _async_session.close()
+
+
+def _shutdown_background_loop() -> None:
+    try:
+        asyncio.run_coroutine_threadsafe(_close_async_session(), _background_loop).result(timeout=5)
+    finally:
+        _background_loop.call_soon_threadsafe(_background_loop.stop)
+
+
+def run_remote_ocr(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine that calls the *_async OCR functions on the shared background loop and wait for its result.
+    The *_async functions must only be awaited through this helper, since the HTTP session belongs to that loop.
+    """
+    return asyncio.run_coroutine_threadsafe(_with_request_ocr_results(coroutine), _get_background_loop()).result()
+
+
+async def _with_request_ocr_results(coroutine: Coroutine[Any, Any, T]) -> T:
+    # Runs as its own task, so the cache is only seen by the OCR requests of this call
+    _request_ocr_results.set(_OcrResultCache())
+    return await coroutine
+
+
+async def _with_timeout(coroutine: Coroutine[Any, Any, str]) -> str:
+    # A stalled keep-alive socket can outlive the session timeout; the hard deadline frees the caller's semaphore slot
+    try:
+        return await asyncio.wait_for(coroutine, REMOTE_OCR_TIMEOUT_SEC + _TIMEOUT_GRACE_SEC)
+    except asyncio.TimeoutError:
+        logger.warning(f"Remote OCR request timed out after {REMOTE_OCR_TIMEOUT_SEC}s, continuing without it")
+        return ""
+
+
+async def _create_chat_completion_async(messages: list[dict], model: str) -> str:
+    return await _with_timeout(_post_chat_completion_async(messages, model))
+
+
+def _is_retryable_status(status: int) -> bool:
+    return status in _RETRYABLE_STATUSES or status >= 500
+
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    # Same policy as the OpenAI SDK: a short Retry-After is honoured, otherwise exponential backoff with jitter
+    try:
+        if retry_after is not None and 0 < float(retry_after) <= 60:
+            return float(retry_after)
+    except ValueError:
+        pass
+    delay = min(_INITIAL_RETRY_DELAY_SEC * 2**attempt, _MAX_RETRY_DELAY_SEC)
+    return delay * (1 - 0.25 * random.random())
+
+
+async def _post_chat_completion_async(messages: list[dict], model: str) -> str:
+    # Plain POST on a shared aiohttp pool: the SDK's httpx transport stops scaling past a handful of concurrent calls
+    payload = {"model": model, "messages": messages, "temperature": REMOTE_OCR_TEMPERATURE}
+    # orjson handles the multi-megabyte base64 strings several times faster than the stdlib json aiohttp uses
+    body = orjson.dumps(payload)
+    for attempt in range(_MAX_RETRIES + 1):
+        is_last_attempt = attempt == _MAX_RETRIES
+        try:
+            async with _get_async_session().post(_CHAT_COMPLETIONS_URL, data=body, headers=_JSON_HEADERS) as response:
+                if is_last_attempt or not _is_retryable_status(response.status):
+                    response.raise_for_status()
+                    data = orjson.loads(await response.read())
+                    return data["choices"][0]["message"]["content"] or ""
+                retry_after = response.headers.get("Retry-After")
+                logger.warning(f"Remote OCR request failed with HTTP {response.status}, retrying")
+        except aiohttp.ClientConnectionError as e:
+            if is_last_attempt:
+                raise
+            retry_after = None
+            logger.warning(f"Remote OCR connection failed ({e}), retrying")
+        await asyncio.sleep(_retry_delay(attempt, retry_after))
+
+
+def _strip_code_fences(text: str, strip_newlines: bool = True) -> str:
     text = (text or "").strip()
-    if text.startswith("```"):
-        # remove first fence line
-        parts = text.split("\n", 1)
-        text = parts[1] if len(parts) > 1 else ""
-        # remove trailing fence
-        if text.rstrip().endswith("```"):
-            text = text.rstrip()[:-3]
-    text = text.replace("\n", "")
+    fenced = _FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    if strip_newlines:
+        text = text.translate(_NEWLINE_TABLE)
     return text.strip()
 
 
-def ocr_table_html(image: Image.Image, model: Optional[str] = None) -> str:
-    client = _get_client()
-    response = client.chat.completions.create(
-        model=model or REMOTE_OCR_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": _pil_image_to_data_url(image)}},
-                    {
-                        "type": "text",
-                        "text": (
-                            "Extract the table from the image.\n"
-                            "Return ONLY valid HTML for the table (prefer <table>...</table>).\n"
-                            "Do NOT include markdown fences or any extra text."
-                        ),
-                    },
-                ],
-            }
-        ],
-        temperature=REMOTE_OCR_TEMPERATURE,
+class _OcrResultCache:
+    """
+    OCR answers keyed by _ocr_cache_key, and the requests for them still on the wire, so identical crops gathered
+    together share one call (in_flight is only touched from the background loop).
+    """
+
+    def __init__(self):
+        self.results: LRUCache = LRUCache(maxsize=_OCR_RESULT_CACHE_SIZE)
+        self.lock = threading.Lock()
+        self.in_flight: dict[tuple, asyncio.Future] = {}
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self.lock:
+            return self.results.get(key)
+
+    def put(self, key: tuple, text: str) -> None:
+        with self.lock:
+            self.results[key] = text
+
+
+# At temperature 0 an answer is reproducible and kept for the whole process; a sampled answer is one draw among many,
+# so it is only reused within the run_remote_ocr call (one document) that produced it
+_process_ocr_results: Optional[_OcrResultCache] = _OcrResultCache() if REMOTE_OCR_TEMPERATURE == 0 else None
+_request_ocr_results: ContextVar[Optional[_OcrResultCache]] = ContextVar("request_ocr_results", default=None)
+
+
+def _current_ocr_results() -> Optional[_OcrResultCache]:
+    if _process_ocr_results is not None:
+        return _process_ocr_results
+    return _request_ocr_results.get()
+
+
+def _ocr_cache_key(kind: str, data_url: str, model: str) -> tuple:
+    # Recurring formulas and boilerplate tables encode to the same data URL, whatever page they were cut from
+    return hashkey(kind, model, hashlib.blake2b(data_url.encode(), digest_size=16).digest())
+
+
+def _cached_ocr(key: tuple, request: Callable[[], str], is_valid: Callable[[str], bool]) -> str:
+    cache = _current_ocr_results()
+    if cache is None:
+        return request()
+    cached_text = cache.get(key)
+    if cached_text is not None:
+        return cached_text
+    text = request()
+    # Answers the caller would reject are not kept, so a later request can get a usable one
+    if is_valid(text):
+        cache.put(key, text)
+    return text
+
+
+async def _cached_ocr_async(key: tuple, request: Callable[[], Awaitable[str]], is_valid: Callable[[str], bool]) -> str:
+    cache = _current_ocr_results()
+    if cache is None:
+        return await request()
+    cached_text = cache.get(key)
+    if cached_text is not None:
+        return cached_text
+    in_flight = cache.in_flight.get(key)
+    if in_flight is not None:
+        return await asyncio.shield(in_flight)
+    task = asyncio.ensure_future(request())
+    cache.in_flight[key] = task
+    try:
+        text = await task
+    finally:
+        cache.in_flight.pop(key, None)
+    if is_valid(text):
+        cache.put(key, text)
+    return text
+
+
+def _build_messages(data_urls: list[str], prompt: str) -> list[dict]:
+    return [
+        {
+            "role": "user",
+            "content": [{"type": "image_url", "image_url": {"url": data_url}} for data_url in data_urls]
+            + [{"type": "text", "text": prompt}],
+        }
+    ]
+
+
+def _create_chat_completion(messages: list[dict], model: str) -> str:
+    response = _get_client().chat.completions.create(model=model, messages=messages, temperature=REMOTE_OCR_TEMPERATURE)
+    return response.choices[0].message.content or ""
+
+
+def _has_json_control_escape(text: str) -> bool:
+    return not _JSON_CONTROL_ESCAPES.isdisjoint(text)
+
+
+def _formulas_batch_prompt(count: int) -> str:
+    return (
+        f"Extract the equation from each of the {count} images, in the order given.\n"
+        f"Return ONLY a JSON array of {count} strings, each one the LaTeX expression of one image.\n"
+        "Do NOT wrap the expressions in $$ or \\( \\). Do NOT include any extra text."
     )
-    return _strip_code_fences(response.choices[0].message.content or "")
-
-
-async def ocr_table_html_async(image: Image.Image, model: Optional[str] = None) -> str:
-    client = _get_async_client()
-    response = await client.chat.completions.create(
-        model=model or REMOTE_OCR_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": _pil_image_to_data_url(image)}},
-                    {
-                        "type": "text",
-                        "text": (
-                            "Extract the table from the image.\n"
-                            "Return ONLY valid HTML for the table (prefer <table>...</table>).\n"
-                            "Do NOT include markdown fences or any extra text."
-                        ),
-                    },
-                ],
-            }
-        ],
-        temperature=REMOTE_OCR_TEMPERATURE,
+
+
+def ocr_table_html_from_data_url(data_url: str, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool) -> str:
+    """
+    OCR a table from an image already turned into a data URL (see pil_image_to_data_url).
+    Callers that may ask more than once (retries, fallback models) encode the image a single time.
+    Only answers accepted by is_valid are cached.
+    """
+    model = model or REMOTE_OCR_MODEL
+    return _cached_ocr(
+        _ocr_cache_key("table", data_url, model),
+        lambda: _strip_code_fences(_create_chat_completion(_build_messages([data_url], _TABLE_PROMPT), model)),
+        is_valid,
     )
-    return _strip_code_fences(response.choices[0].message.content or "")
-
-
-def ocr_formula_latex(image: Image.Image, model: Optional[str] = None) -> str:
-    client = _get_client()
-    response = client.chat.completions.create(
-        model=model or REMOTE_OCR_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": _pil_image_to_data_url(image)}},
-                    {
-                        "type": "text",
-                        "text": (
-                            "Extract the equation from the image.\n"
-                            "Return ONLY the LaTeX expression.\n"
-                            "Do NOT wrap it in $$ or \\( \\). Do NOT include any extra text."
-                        ),
-                    },
-                ],
-            }
-        ],
-        temperature=REMOTE_OCR_TEMPERATURE,
+
+
+def ocr_table_html(image: Image.Image, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool) -> str:
+    return ocr_table_html_from_data_url(
+        pil_image_to_data_url(image, max_side=REMOTE_OCR_TABLE_MAX_IMAGE_SIDE), model, is_valid
+    )
+
+
+async def ocr_table_html_from_data_url_async(
+    data_url: str, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool
+) -> str:
+    model = model or REMOTE_OCR_MODEL
+    return await _cached_ocr_async(
+        _ocr_cache_key("table", data_url, model), lambda: _request_table_html_async(data_url, model), is_valid
+    )
+
+
+async def _request_table_html_async(data_url: str, model: str) -> str:
+    content = await _create_chat_completion_async(_build_messages([data_url], _TABLE_PROMPT), model)
+    return _strip_code_fences(content)
+
+
+async def ocr_table_html_async(
+    image: Image.Image, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool
+) -> str:
+    # Resizing and encoding run on a worker thread, so the shared event loop keeps serving other requests
+    data_url = await asyncio.to_thread(pil_image_to_data_url, image, max_side=REMOTE_OCR_TABLE_MAX_IMAGE_SIDE)
+    return await ocr_table_html_from_data_url_async(data_url, model, is_valid)
+
+
+def ocr_formula_latex_from_data_url(
+    data_url: str, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool
+) -> str:
+    """
+    OCR a formula from an image already turned into a data URL (see pil_image_to_data_url).
+    Only answers accepted by is_valid are cached.
+    """
+    model = model or REMOTE_OCR_MODEL
+    return _cached_ocr(
+        _ocr_cache_key("formula", data_url, model),
+        lambda: _strip_code_fences(
+            _create_chat_completion(_build_messages([data_url], _FORMULA_PROMPT), model), strip_newlines=False
+        ),
+        is_valid,
     )
-    return _strip_code_fences(response.choices[0].message.content or "")
-
-
-async def ocr_formula_latex_async(image: Image.Image, model: Optional[str] = None) -> str:
-    client = _get_async_client()
-    response = await client.chat.completions.create(
-        model=model or REMOTE_OCR_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image_url", "image_url": {"url": _pil_image_to_data_url(image)}},
-                    {
-                        "type": "text",
-                        "text": (
-                            "Extract the equation from the image.\n"
-                            "Return ONLY the LaTeX expression.\n"
-                            "Do NOT wrap it in $$ or \\( \\). Do NOT include any extra text."
-                        ),
-                    },
-                ],
-            }
-        ],
-        temperature=REMOTE_OCR_TEMPERATURE,
+
+
+def ocr_formula_latex(image: Image.Image, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool) -> str:
+    return ocr_formula_latex_from_data_url(pil_image_to_data_url(image), model, is_valid)
+
+
+async def ocr_formula_latex_from_data_url_async(
+    data_url: str, model: Optional[str] = None, is_valid: Callable[[str], bool] = bool
+) -> str:
+    model = model or REMOTE_OCR_MODEL
+    return await _cached_ocr_async(
+        _ocr_cache_key("formula", data_url, model), lambda: _request_formula_latex_async(data_url, model), is_valid
     )
-    return _strip_code_fences(response.choices[0].message.content or "")
 
+
+async def _request_formula_latex_async(data_url: str, model: str) -> str:
+    content = await _create_chat_completion_async(_build_messages([data_url], _FORMULA_PROMPT), model)
+    return _strip_code_fences(content, strip_newlines=False)
+
+
+async def ocr_formulas_latex_batch_from_data_urls_async(data_urls: list[str], model: Optional[str] = None) -> list[str]:
+    """
+    OCR several formula images in a single multi-image request, one prefill instead of one per formula.
+    Raises ValueError when the answer is not a JSON array with one LaTeX string per image.
+    """
+    content = await _create_chat_completion_async(
+        _build_messages(data_urls, _formulas_batch_prompt(len(data_urls))), model or REMOTE_OCR_MODEL
+    )
+    latex_list = orjson.loads(_strip_code_fences(content, strip_newlines=False))
+    if (
+        not isinstance(latex_list, list)
+        or len(latex_list) != len(data_urls)
+        or not all(isinstance(x, str) for x in latex_list)
+    ):
+        raise ValueError(f"Expected a JSON array of {len(data_urls)} LaTeX strings")
+    # Backslashes the model forgot to double decode as JSON escapes ("\frac" -> form feed + "rac") instead of failing
+    if any(_has_json_control_escape(latex) for latex in latex_list):
+        raise ValueError("LaTeX strings contain JSON control escapes, backslashes were not doubled")
+    return latex_list
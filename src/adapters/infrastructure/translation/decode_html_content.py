@@ -1,24 +1,30 @@
 import re
 
+BOLD_ITALIC_PATTERN = re.compile(r"\[BI(\d+)\](.*?)\[BI\1\]")
+BOLD_PATTERN = re.compile(r"\[B(\d+)\](.*?)\[B\1\]")
+ITALIC_PATTERN = re.compile(r"\[IT(\d+)\](.*?)\[IT\1\]")
+LINK_PATTERN = re.compile(r"\[LINK(\d+)\](.*?)\[LINK\1\]")
+DOC_REF_PATTERN = re.compile(r"\[DOCREF(\d+)\]")
+
 
 def decode_html(text, link_map, doc_ref_map):
     # 1. Decode bold+italic first
     def bold_italic_decoder(match):
         return f"<b><i>{match.group(2)}</i></b>"
 
-    text = re.sub(r"\[BI(\d+)\](.*?)\[BI\1\]", bold_italic_decoder, text)
+    text = BOLD_ITALIC_PATTERN.sub(bold_italic_decoder, text)
 
     # 2. Decode bold
     def bold_decoder(match):
         return f"<b>{match.group(2)}</b>"
 
-    text = re.sub(r"\[B(\d+)\](.*?)\[B\1\]", bold_decoder, text)
+    text = BOLD_PATTERN.sub(bold_decoder, text)
 
     # 3. Decode italic
     def italic_decoder(match):
         return f"<i>{match.group(2)}</i>"
 
-    text = re.sub(r"\[IT(\d+)\](.*?)\[IT\1\]", italic_decoder, text)
+    text = ITALIC_PATTERN.sub(italic_decoder, text)
 
     # 4. Decode links
     def link_decoder(match):
@@ -30,7 +36,9 @@ def decode_html(text, link_map, doc_ref_map):
             # Return original text if index is out of range
             return match.group(0)
 
-    text = re.sub(r"\[LINK(\d+)\](.*?)\[LINK\1\]", link_decoder, text)
+    # Without encoded links every marker would be returned unchanged, so the pass is skipped
+    if link_map:
+        text = LINK_PATTERN.sub(link_decoder, text)
 
     # 5. Decode doc refs (same as markdown since they're custom)
     def doc_ref_decoder(match):
@@ -41,7 +49,8 @@ def decode_html(text, link_map, doc_ref_map):
             # Return original text if index is out of range
             return match.group(0)
 
-    text = re.sub(r"\[DOCREF(\d+)\]", doc_ref_decoder, text)
+    if doc_ref_map:
+        text = DOC_REF_PATTERN.sub(doc_ref_decoder, text)
     text = " ".join(text.split())
 
     return text
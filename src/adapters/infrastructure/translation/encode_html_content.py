@@ -1,5 +1,12 @@
 import re
 
+LINK_OPEN_PATTERN = re.compile(r'<a\s+href=["\']([^"\']+)["\'][^>]*>', re.IGNORECASE)
+BOLD_ITALIC_PATTERN = re.compile(r"<b><i>([^<]+)</i></b>", re.IGNORECASE)
+ITALIC_BOLD_PATTERN = re.compile(r"<i><b>([^<]+)</b></i>", re.IGNORECASE)
+BOLD_PATTERN = re.compile(r"<b>([^<]+)</b>", re.IGNORECASE)
+ITALIC_WITH_LINKS_PATTERN = re.compile(r"<i>([^<]*(?:\[LINK\d+\][^\[]*\[LINK\d+\][^<]*)*)</i>", re.IGNORECASE)
+ITALIC_PATTERN = re.compile(r"<i>([^<]+)</i>", re.IGNORECASE)
+
 
 def encode_html(text):
     text = text.replace("</i> <i>", " ")
@@ -29,8 +36,7 @@ def encode_html(text):
         offset = 0  # Track how much the text has shifted due to replacements
 
         # Find all <a href="..." tags
-        pattern = r'<a\s+href=["\']([^"\']+)["\'][^>]*>'
-        matches = list(re.finditer(pattern, text, re.IGNORECASE))
+        matches = list(LINK_OPEN_PATTERN.finditer(text))
 
         # Process from left to right
         for match in matches:
@@ -90,11 +96,11 @@ def encode_html(text):
 
     # 2. Encode bold+italic combinations BEFORE individual bold/italic
     # Handle <b><i>text</i></b> and <i><b>text</b></i> - only simple cases without nested links
-    text = re.sub(r"<b><i>([^<]+)</i></b>", bold_italic_replacer, text, flags=re.IGNORECASE)
-    text = re.sub(r"<i><b>([^<]+)</b></i>", bold_italic_replacer, text, flags=re.IGNORECASE)
+    text = BOLD_ITALIC_PATTERN.sub(bold_italic_replacer, text)
+    text = ITALIC_BOLD_PATTERN.sub(bold_italic_replacer, text)
 
     # 3. Encode bold (<b>text</b>) - only simple cases without nested tags
-    text = re.sub(r"<b>([^<]+)</b>", bold_replacer, text, flags=re.IGNORECASE)
+    text = BOLD_PATTERN.sub(bold_replacer, text)
 
     # 4. Encode italic (<i>text</i>) - handle cases that might contain encoded links
     def italic_with_links_replacer(match):
@@ -104,10 +110,8 @@ def encode_html(text):
         return f"[IT{idx}]{content}[IT{idx}]"
 
     # Handle italic tags that might contain encoded links
-    text = re.sub(
-        r"<i>([^<]*(?:\[LINK\d+\][^\[]*\[LINK\d+\][^<]*)*)</i>", italic_with_links_replacer, text, flags=re.IGNORECASE
-    )
+    text = ITALIC_WITH_LINKS_PATTERN.sub(italic_with_links_replacer, text)
     # Handle simple italic tags
-    text = re.sub(r"<i>([^<]+)</i>", italic_with_links_replacer, text, flags=re.IGNORECASE)
+    text = ITALIC_PATTERN.sub(italic_with_links_replacer, text)
 
     return text, link_map, doc_ref_map
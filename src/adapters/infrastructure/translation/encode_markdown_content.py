@@ -1,5 +1,12 @@
 import re
 
+# One character per repetition: "(?:[^\[\]]+|...)*" backtracks exponentially on unclosed brackets
+LINK_PATTERN = re.compile(r"(\[((?:[^\[\]]|\[[^\[\]]*\])*)\])\((https?://[^\)]+)\)")
+BOLD_ITALIC_PATTERN = re.compile(r"\*\*\_([^\*_]+)\_\*\*")
+ITALIC_BOLD_PATTERN = re.compile(r"_\*([^\*_]+)\*_")
+BOLD_PATTERN = re.compile(r"\*\*([^\*]+)\*\*")
+ITALIC_PATTERN = re.compile(r"\_([^\_]+)\_")
+
 
 def encode_markdown(text):
     text = text.replace("_ _", " ")
@@ -41,21 +48,19 @@ def encode_markdown(text):
     doc_ref_map = []
 
     # 1. Encode links BEFORE formatting to avoid matching underscores in URLs
-    link_pattern = re.compile(r"(\[((?:[^\[\]]+|\[[^\[\]]*\])*)\])\((https?://[^\)]+)\)")
-    while True:
-        new_text = link_pattern.sub(lambda m: link_replacer(m), text)
-        if new_text == text:
-            break
-        text = new_text
+    # Links nested in a label only match once their enclosing link is encoded, so passes repeat until none is left
+    replaced = 1
+    while replaced and "](http" in text:
+        text, replaced = LINK_PATTERN.subn(link_replacer, text)
 
     # 2. Encode bold+italic BEFORE individual bold/italic
-    text = re.sub(r"\*\*\_([^\*_]+)\_\*\*", bold_italic_replacer, text)
-    text = re.sub(r"_\*([^\*_]+)\*_", bold_italic_replacer, text)
+    text = BOLD_ITALIC_PATTERN.sub(bold_italic_replacer, text)
+    text = ITALIC_BOLD_PATTERN.sub(bold_italic_replacer, text)
 
     # 3. Encode bold
-    text = re.sub(r"\*\*([^\*]+)\*\*", bold_replacer, text)
+    text = BOLD_PATTERN.sub(bold_replacer, text)
 
     # 4. Encode italic
-    text = re.sub(r"\_([^\_]+)\_", italic_replacer, text)
+    text = ITALIC_PATTERN.sub(italic_replacer, text)
 
     return text, link_map, doc_ref_map
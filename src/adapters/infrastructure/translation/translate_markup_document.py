@@ -96,8 +96,7 @@ def translate_markdown(
             response = get_translation(ollama_manager, model, content, markdown_part)
             translated_markdown_parts.append(response)
             if extract_toc:
-                title_segments.append(segments[index])
-                title_segments[-1].text = response.replace("#", "").strip()
+                title_segments.append(segments[index].model_copy(update={"text": response.replace("#", "").strip()}))
             continue
         if segments[index].type == TokenType.FORMULA:
             translated_markdown_parts.append(markdown_part)
@@ -145,8 +144,7 @@ def translate_html(
             response = get_translation(ollama_manager, model, content, html_part)
             translated_html_parts.append(response)
             if extract_toc:
-                title_segments.append(segments[index])
-                title_segments[-1].text = response.replace("#", "").strip()
+                title_segments.append(segments[index].model_copy(update={"text": response.replace("#", "").strip()}))
             continue
         if segments[index].type == TokenType.FORMULA:
             translated_html_parts.append(html_part)
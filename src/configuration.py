@@ -13,6 +13,9 @@ service_logger = logging.getLogger(__name__)
 
 RESTART_IF_NO_GPU = os.environ.get("RESTART_IF_NO_GPU", "false").lower().strip() == "true"
 
+# Background workers per request rendering high-DPI page images (tables & formulas) while layout prediction runs
+PAGE_RENDER_WORKERS = max(1, int(os.environ.get("PAGE_RENDER_WORKERS", "2")))
+
 # Remote OCR (tables & formulas) via OpenAI-compatible HTTP endpoint (e.g. vLLM)
 REMOTE_OCR_ENABLED = os.environ.get("REMOTE_OCR_ENABLED", "false").lower().strip() == "true"
 REMOTE_OCR_BASE_URL = os.environ.get("REMOTE_OCR_BASE_URL", "http://vllm-ocr:8000/v1").strip()
@@ -22,6 +25,24 @@ REMOTE_OCR_TEMPERATURE = float(os.environ.get("REMOTE_OCR_TEMPERATURE", "0.5"))
 REMOTE_OCR_TIMEOUT_SEC = float(os.environ.get("REMOTE_OCR_TIMEOUT_SEC", "120"))
 REMOTE_OCR_MAX_CONCURRENCY = max(1, int(os.environ.get("REMOTE_OCR_MAX_CONCURRENCY", "4")))
 REMOTE_OCR_MAX_IMAGE_TOKENS = max(0, int(os.environ.get("REMOTE_OCR_MAX_IMAGE_TOKENS", "0")))
+REMOTE_OCR_MAX_IMAGE_SIDE = max(0, int(os.environ.get("REMOTE_OCR_MAX_IMAGE_SIDE", "1536")))
+# Formulas sent together in one multi-image request; 1 keeps one request per formula
+REMOTE_OCR_FORMULA_BATCH_SIZE = max(1, int(os.environ.get("REMOTE_OCR_FORMULA_BATCH_SIZE", "1")))
+# Upload encoding for OCR crops: "jpeg" (smaller payloads) or "png" (lossless)
+REMOTE_OCR_IMAGE_FORMAT = os.environ.get("REMOTE_OCR_IMAGE_FORMAT", "jpeg").lower().strip()
+REMOTE_OCR_JPEG_QUALITY = min(100, max(1, int(os.environ.get("REMOTE_OCR_JPEG_QUALITY", "85"))))
+# Longest side (px) of table crops sent to the remote model, in place of REMOTE_OCR_MAX_IMAGE_SIDE; 0 keeps the rendered size
+REMOTE_OCR_TABLE_MAX_IMAGE_SIDE = max(0, int(os.environ.get("REMOTE_OCR_TABLE_MAX_IMAGE_SIDE", "1280")))
+
+# Local table recognition (RapidOCR + RapidTable): worker threads, each with its own single-threaded ONNX sessions
+LOCAL_TABLE_OCR_WORKERS = max(1, int(os.environ.get("LOCAL_TABLE_OCR_WORKERS", "4")))
+
+# Encoding of pictures extracted into markup ZIPs: "png" (lossless) or "jpeg" (smaller, faster)
+PICTURE_IMAGE_FORMAT = os.environ.get("PICTURE_IMAGE_FORMAT", "png").lower().strip()
+PICTURE_JPEG_QUALITY = min(100, max(1, int(os.environ.get("PICTURE_JPEG_QUALITY", "90"))))
+
+# Target languages translated concurrently; Ollama batches the overlapping requests
+TRANSLATION_WORKERS = max(1, int(os.environ.get("TRANSLATION_WORKERS", "2")))
 
 IMAGES_ROOT_PATH = Path(ROOT_PATH, "images")
 WORD_GRIDS_PATH = Path(ROOT_PATH, "word_grids")
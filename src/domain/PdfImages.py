@@ -13,14 +13,15 @@ from src.domain.pdf_features_loader import load_pdf_features
 
 
 class PdfImages:
-    def __init__(self, pdf_features: PdfFeatures, pdf_images: list[Image], dpi: int = 72):
+    def __init__(self, pdf_features: PdfFeatures, pdf_images: list[Image], dpi: int = 72, save_to_disk: bool = True):
         self.pdf_features: PdfFeatures = pdf_features
         self.pdf_images: list[Image] = pdf_images
         self.dpi: int = dpi
         # Per-request isolated workdir: UUID-based subdirectory under shared IMAGES_ROOT_PATH.
         # Prevents concurrent requests from racing on cleanup of a shared directory.
         self.images_dir: Path = Path(IMAGES_ROOT_PATH) / pdf_features.file_name
-        self.save_images()
+        if save_to_disk:
+            self.save_images()
 
     def show_images(self, next_image_delay: int = 2):
         for image_index, image in enumerate(self.pdf_images):
@@ -1,8 +1,23 @@
 from domain.PdfSegment import PdfSegment
 from pdf_features import PdfPage
 from pdf_token_type_labels import TokenType
+from operator import itemgetter
+from typing import Union
 from pydantic import BaseModel
 
+_SEGMENT_FIELDS = ("left", "top", "width", "height", "page_number", "page_width", "page_height", "text", "type")
+_SEGMENT_FIELD_DEFAULTS = (0, 0, 0, 0, 1, 0, 0, "", "TEXT")
+_get_segment_fields = itemgetter(*_SEGMENT_FIELDS)
+_token_type_by_text: dict[str, TokenType] = {}
+
+
+def _token_type_from_text(text: str) -> TokenType:
+    # Type names repeat across every segment of a document, so each spelling is normalized only once
+    token_type = _token_type_by_text.get(text)
+    if token_type is None:
+        token_type = _token_type_by_text[text] = TokenType.from_text(text)
+    return token_type
+
 
 class SegmentBox(BaseModel):
     left: float
@@ -59,6 +74,42 @@ class SegmentBox(BaseModel):
             type=pdf_segment.segment_type,
         )
 
+    @staticmethod
+    def from_dicts(
+        items: list[Union[dict, "SegmentBox"]], skip_types: frozenset[TokenType] = frozenset()
+    ) -> list["SegmentBox"]:
+        segments: list[SegmentBox] = []
+        for item in items:
+            if isinstance(item, SegmentBox):
+                if item.type not in skip_types:
+                    segments.append(item)
+                continue
+            if not isinstance(item, dict):
+                continue
+            try:
+                values = _get_segment_fields(item)
+            except KeyError:
+                values = tuple(item.get(field, default) for field, default in zip(_SEGMENT_FIELDS, _SEGMENT_FIELD_DEFAULTS))
+            left, top, width, height, page_number, page_width, page_height, text, type_text = values
+            # Normalize type from raw analysis payload (may be "Page footer", "Page_Footer", etc.)
+            token_type = _token_type_from_text(type_text)
+            if token_type in skip_types:
+                continue
+            segments.append(
+                SegmentBox(
+                    left=left,
+                    top=top,
+                    width=width,
+                    height=height,
+                    page_number=page_number,
+                    page_width=page_width,
+                    page_height=page_height,
+                    text=text,
+                    type=token_type,
+                )
+            )
+        return segments
+
 
 if __name__ == "__main__":
     a = TokenType.TEXT
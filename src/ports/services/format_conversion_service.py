@@ -12,3 +12,9 @@ class FormatConversionService(ABC):
     @abstractmethod
     def convert_formula_to_latex(self, pdf_images: PdfImages, segments: list[PdfSegment]) -> None:
         pass
+
+    @abstractmethod
+    def convert_tables_and_formulas(
+        self, table_pdf_images: PdfImages, formula_pdf_images: PdfImages, segments: list[PdfSegment]
+    ) -> None:
+        pass
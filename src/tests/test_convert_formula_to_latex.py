@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import AsyncMock, patch
+
+from adapters.infrastructure.format_converters import convert_formula_to_latex
+from adapters.infrastructure.format_converters.convert_formula_to_latex import (
+    extract_formula_format_async,
+    is_valid_remote_latex,
+)
+
+
+def get_formula_segments(count: int) -> list[SimpleNamespace]:
+    # Only the text content is read and written by the remote formula OCR
+    return [SimpleNamespace(text_content=f"formula {i}") for i in range(count)]
+
+
+class TestConvertFormulaToLatex(TestCase):
+    def extract_formula_format(self, formula_segments: list, batch_ocr: AsyncMock, single_ocr: AsyncMock):
+        with (
+            patch.object(convert_formula_to_latex, "REMOTE_OCR_FORMULA_BATCH_SIZE", 4),
+            patch.object(convert_formula_to_latex, "crop_segments", lambda _, segments: list(range(len(segments)))),
+            patch.object(convert_formula_to_latex, "pil_image_to_data_url", lambda image: f"data:{image}"),
+            patch.object(convert_formula_to_latex, "ocr_formulas_latex_batch_from_data_urls_async", batch_ocr),
+            patch.object(convert_formula_to_latex, "ocr_formula_latex_from_data_url_async", single_ocr),
+        ):
+            asyncio.run(extract_formula_format_async(None, formula_segments))
+
+    def test_extract_formula_format_in_batches(self):
+        formula_segments = get_formula_segments(5)
+        batch_ocr = AsyncMock(side_effect=lambda data_urls: [f"x_{url[-1]}" for url in data_urls])
+        single_ocr = AsyncMock()
+
+        self.extract_formula_format(formula_segments, batch_ocr, single_ocr)
+
+        self.assertEqual(["$$x_0$$", "$$x_1$$", "$$x_2$$", "$$x_3$$", "$$x_4$$"], [s.text_content for s in formula_segments])
+        self.assertEqual([4, 1], [len(call.args[0]) for call in batch_ocr.await_args_list])
+        single_ocr.assert_not_awaited()
+
+    def test_extract_formula_format_retries_failed_batch_one_by_one(self):
+        formula_segments = get_formula_segments(3)
+        batch_ocr = AsyncMock(side_effect=ValueError("Expected a JSON array of 3 LaTeX strings"))
+        single_ocr = AsyncMock(
+            side_effect=lambda data_url, is_valid: {"data:0": "a+b", "data:1": "", "data:2": "c"}[data_url]
+        )
+
+        self.extract_formula_format(formula_segments, batch_ocr, single_ocr)
+
+        self.assertEqual(["$$a+b$$", "formula 1", "$$c$$"], [s.text_content for s in formula_segments])
+        self.assertEqual(["data:0", "data:1", "data:2"], sorted(call.args[0] for call in single_ocr.await_args_list))
+        self.assertTrue(all(call.kwargs["is_valid"] is is_valid_remote_latex for call in single_ocr.await_args_list))
+
+    def test_extract_formula_format_keeps_text_when_single_request_fails(self):
+        formula_segments = get_formula_segments(2)
+        batch_ocr = AsyncMock(side_effect=ValueError("LaTeX strings contain JSON control escapes"))
+        single_ocr = AsyncMock(side_effect=[TimeoutError(), "y"])
+
+        self.extract_formula_format(formula_segments, batch_ocr, single_ocr)
+
+        self.assertEqual(["formula 0", "$$y$$"], [s.text_content for s in formula_segments])
@@ -0,0 +1,65 @@
+import random
+import re
+from unittest import TestCase
+
+from adapters.infrastructure.translation.encode_html_content import encode_html
+from adapters.infrastructure.translation.encode_markdown_content import encode_markdown
+
+
+def encode_markdown_links_brute_force(text: str) -> tuple[str, list[tuple[str, str]]]:
+    link_map = []
+
+    def link_replacer(match):
+        label = match.group(1)[1:-1]
+        url = match.group(3)
+        idx = len(link_map)
+        link_map.append((label, url))
+        return f"[LINK{idx}]{label}[LINK{idx}]"
+
+    link_pattern = re.compile(r"(\[((?:[^\[\]]+|\[[^\[\]]*\])*)\])\((https?://[^\)]+)\)")
+    while True:
+        new_text = link_pattern.sub(link_replacer, text)
+        if new_text == text:
+            break
+        text = new_text
+    return text, link_map
+
+
+class TestEncodeMarkupContent(TestCase):
+    def test_encode_markdown(self):
+        text, link_map, _ = encode_markdown("See **bold** and _it_ in [the [docs]](https://example.com/a_b).")
+
+        self.assertEqual("See [B0]bold[B0] and [IT0]it[IT0] in [LINK0]the [docs][LINK0].", text)
+        self.assertEqual([("the [docs]", "https://example.com/a_b")], link_map)
+
+    def test_encode_markdown_nested_links(self):
+        text, link_map, _ = encode_markdown("[outer [inner](http://b) text](http://a)")
+
+        self.assertEqual(encode_markdown_links_brute_force("[outer [inner](http://b) text](http://a)"), (text, link_map))
+        self.assertEqual(2, len(link_map))
+
+    def test_encode_markdown_links_match_brute_force(self):
+        # Without "*" and "_" only the link passes change the text, so they are compared on their own.
+        # Inputs stay short because the replaced pattern backtracks exponentially on long unclosed labels
+        pieces = ["[", "]", "(", ")", "a", " ", "](", "http://x", "[a](http://x)", "[[a]](https://y)"]
+        generator = random.Random(0)
+        for _ in range(10000):
+            text = ""
+            max_length = generator.randint(0, 16)
+            while len(text) < max_length:
+                text += generator.choice(pieces)
+            encoded_text, link_map, _ = encode_markdown(text)
+
+            self.assertEqual(encode_markdown_links_brute_force(text), (encoded_text, link_map), text)
+
+    def test_encode_markdown_unclosed_bracket_does_not_backtrack(self):
+        text = "[" + "word " * 2000 + "](http"
+
+        self.assertEqual(text, encode_markdown(text)[0])
+
+    def test_encode_html(self):
+        text, link_map, _ = encode_html('See <b>bold</b> and <i>it</i> in <a href="https://example.com">the docs</a>.')
+
+        self.assertIn("[B0]bold[B0]", text)
+        self.assertIn("[IT0]it[IT0]", text)
+        self.assertEqual(1, len(link_map))
@@ -0,0 +1,169 @@
+import io
+import json
+import random
+import zipfile
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import Mock
+
+from pdf_features.Rectangle import Rectangle
+from pdf_token_type_labels.TokenType import TokenType
+
+from adapters.infrastructure.markup_conversion.ExtractedImage import ExtractedImage
+from adapters.infrastructure.markup_conversion.OutputFormat import OutputFormat
+from adapters.infrastructure.markup_conversion.pdf_to_markup_service_adapter import PdfToMarkupServiceAdapter
+from domain.SegmentBox import SegmentBox
+
+
+def get_formulas_inside_tables_brute_force(segments_in_page: list[SegmentBox]) -> set[int]:
+    table_boxes = [
+        Rectangle.from_width_height(s.left, s.top, s.width, s.height) for s in segments_in_page if s.type == TokenType.TABLE
+    ]
+    formulas_inside_tables = set()
+    for index, segment in enumerate(segments_in_page):
+        if segment.type != TokenType.FORMULA or not table_boxes:
+            continue
+        seg_box = Rectangle.from_width_height(segment.left, segment.top, segment.width, segment.height)
+        inside_table = any(seg_box.get_intersection_percentage(table_box) > 50 for table_box in table_boxes)
+        if not inside_table:
+            cx = (seg_box.left + seg_box.right) / 2.0
+            cy = (seg_box.top + seg_box.bottom) / 2.0
+            inside_table = any((tb.left <= cx <= tb.right) and (tb.top <= cy <= tb.bottom) for tb in table_boxes)
+        if inside_table:
+            formulas_inside_tables.add(index)
+    return formulas_inside_tables
+
+
+def get_tokens_in_segment_brute_force(tokens: list, seg_box: Rectangle) -> list:
+    return [token for token in tokens if token.bounding_box.get_intersection_percentage(seg_box) > 50]
+
+
+def get_tokens_in_segment(tokens: list, seg_box: Rectangle) -> list:
+    token_index = PdfToMarkupServiceAdapter._index_tokens_by_top(tokens)
+    return PdfToMarkupServiceAdapter._get_tokens_in_segment(tokens, token_index, seg_box)
+
+
+def get_token(left: float, top: float, width: float, height: float) -> SimpleNamespace:
+    # Only the bounding box is read by the token lookup
+    return SimpleNamespace(bounding_box=Rectangle.from_width_height(left, top, width, height))
+
+
+def get_segment(left: float, top: float, width: float, height: float, segment_type: TokenType) -> SegmentBox:
+    return SegmentBox(
+        left=left, top=top, width=width, height=height, page_number=1, page_width=612, page_height=792, type=segment_type
+    )
+
+
+def get_random_segment(generator: random.Random, segment_type: TokenType) -> SegmentBox:
+    # Coarse integer grid, so shared edges, touching boxes and zero-area boxes come up often
+    return get_segment(
+        generator.randint(0, 20), generator.randint(0, 20), generator.randint(0, 8), generator.randint(0, 8), segment_type
+    )
+
+
+class TestPdfToMarkupServiceAdapter(TestCase):
+    def test_get_formulas_inside_tables(self):
+        segments = [
+            get_segment(100, 100, 300, 200, TokenType.TABLE),
+            get_segment(150, 150, 50, 20, TokenType.FORMULA),
+            get_segment(380, 290, 60, 30, TokenType.FORMULA),
+            get_segment(100, 400, 50, 20, TokenType.FORMULA),
+            get_segment(150, 120, 50, 20, TokenType.TEXT),
+        ]
+
+        self.assertEqual({1}, PdfToMarkupServiceAdapter._get_formulas_inside_tables(segments))
+
+    def test_get_formulas_inside_tables_without_tables_or_formulas(self):
+        formula = get_segment(150, 150, 50, 20, TokenType.FORMULA)
+        table = get_segment(100, 100, 300, 200, TokenType.TABLE)
+
+        self.assertEqual(set(), PdfToMarkupServiceAdapter._get_formulas_inside_tables([formula]))
+        self.assertEqual(set(), PdfToMarkupServiceAdapter._get_formulas_inside_tables([table]))
+        self.assertEqual(set(), PdfToMarkupServiceAdapter._get_formulas_inside_tables([]))
+
+    def test_get_formulas_inside_tables_boundaries(self):
+        table = get_segment(100, 100, 100, 100, TokenType.TABLE)
+        center_on_edge = get_segment(180, 140, 40, 20, TokenType.FORMULA)
+        center_past_edge = get_segment(181, 140, 40, 20, TokenType.FORMULA)
+        zero_area_inside = get_segment(150, 150, 0, 0, TokenType.FORMULA)
+        zero_area_outside = get_segment(250, 150, 0, 0, TokenType.FORMULA)
+        segments = [table, center_on_edge, center_past_edge, zero_area_inside, zero_area_outside]
+
+        self.assertEqual(
+            get_formulas_inside_tables_brute_force(segments), PdfToMarkupServiceAdapter._get_formulas_inside_tables(segments)
+        )
+        self.assertIn(1, PdfToMarkupServiceAdapter._get_formulas_inside_tables(segments))
+        self.assertNotIn(2, PdfToMarkupServiceAdapter._get_formulas_inside_tables(segments))
+
+    def test_get_formulas_inside_tables_matches_brute_force(self):
+        generator = random.Random(0)
+        for _ in range(2000):
+            segments = [get_random_segment(generator, TokenType.TABLE) for _ in range(generator.randint(0, 3))]
+            segments += [get_random_segment(generator, TokenType.FORMULA) for _ in range(generator.randint(0, 6))]
+            segments += [get_random_segment(generator, TokenType.TEXT) for _ in range(generator.randint(0, 2))]
+            generator.shuffle(segments)
+
+            self.assertEqual(
+                get_formulas_inside_tables_brute_force(segments),
+                PdfToMarkupServiceAdapter._get_formulas_inside_tables(segments),
+                segments,
+            )
+
+    def test_get_tokens_in_segment(self):
+        inside = get_token(110, 110, 40, 10)
+        half_above = get_token(110, 95, 40, 10)
+        mostly_below = get_token(110, 196, 40, 10)
+        tall_mostly_inside = get_token(300, 60, 40, 100)
+        outside = get_token(110, 300, 40, 10)
+        tokens = [outside, tall_mostly_inside, inside, mostly_below, half_above]
+        seg_box = Rectangle.from_width_height(100, 100, 300, 100)
+
+        self.assertEqual([tall_mostly_inside, inside], get_tokens_in_segment(tokens, seg_box))
+
+    def test_get_tokens_in_segment_without_tokens(self):
+        self.assertEqual([], get_tokens_in_segment([], Rectangle.from_width_height(100, 100, 300, 100)))
+
+    def test_get_tokens_in_segment_matches_brute_force(self):
+        generator = random.Random(0)
+        for _ in range(2000):
+            # Coarse integer grid, so tokens on the segment edges and zero-area tokens and segments come up often
+            tokens = [
+                get_token(
+                    generator.randint(0, 20), generator.randint(0, 20), generator.randint(0, 6), generator.randint(0, 6)
+                )
+                for _ in range(generator.randint(0, 15))
+            ]
+            seg_box = Rectangle.from_width_height(
+                generator.randint(0, 20), generator.randint(0, 20), generator.randint(0, 10), generator.randint(0, 10)
+            )
+
+            self.assertEqual(get_tokens_in_segment_brute_force(tokens, seg_box), get_tokens_in_segment(tokens, seg_box))
+
+    def test_zip_round_trip(self):
+        adapter = PdfToMarkupServiceAdapter(OutputFormat.MARKDOWN)
+        images = [ExtractedImage(image_data=b"\x89PNG picture", filename="doc_1_1.png")]
+        segments = [get_segment(10, 20, 30, 40, TokenType.TABLE)]
+        content = "# Title\n\nText with ü " * 100
+
+        entries = adapter._create_zip_entries(content, images, "doc.md", segments, {"es": "# Título"})
+        chunks = list(adapter._iterate_zip_chunks(entries))
+
+        self.assertGreater(len([chunk for chunk in chunks if chunk]), 1)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(
+                ["doc.md", "doc_pictures/doc_1_1.png", "doc_es.md", "doc_segmentation.json"], zip_file.namelist()
+            )
+            self.assertEqual(content, zip_file.read("doc.md").decode("utf-8"))
+            self.assertEqual(b"\x89PNG picture", zip_file.read("doc_pictures/doc_1_1.png"))
+            self.assertEqual("# Título", zip_file.read("doc_es.md").decode("utf-8"))
+            self.assertEqual([segments[0].to_dict()], json.loads(zip_file.read("doc_segmentation.json")))
+            self.assertEqual(zipfile.ZIP_DEFLATED, zip_file.getinfo("doc.md").compress_type)
+            self.assertEqual(zipfile.ZIP_STORED, zip_file.getinfo("doc_pictures/doc_1_1.png").compress_type)
+
+    def test_zip_response_fails_before_streaming(self):
+        adapter = PdfToMarkupServiceAdapter(OutputFormat.MARKDOWN)
+        segment = Mock(to_dict=Mock(side_effect=ValueError("segment cannot be serialized")))
+
+        with self.assertRaises(ValueError):
+            adapter._create_zip_response("content", [], "doc.md", [segment])
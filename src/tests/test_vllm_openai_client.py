@@ -0,0 +1,209 @@
+import asyncio
+import random
+from typing import Optional
+from unittest import TestCase
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohttp
+import numpy as np
+import orjson
+from PIL import Image
+
+from adapters.infrastructure.remote_ocr import vllm_openai_client
+from adapters.infrastructure.remote_ocr.vllm_openai_client import (
+    _pad_to_min_size,
+    _post_chat_completion_async,
+    _retry_delay,
+    _strip_code_fences,
+    ocr_formulas_latex_batch_from_data_urls_async,
+)
+
+
+def strip_code_fences_brute_force(text: str, strip_newlines: bool = True) -> str:
+    text = (text or "").strip()
+    if text.startswith("```"):
+        parts = text.split("\n", 1)
+        text = parts[1] if len(parts) > 1 else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    if strip_newlines:
+        text = text.replace("\n", "")
+    return text.strip()
+
+
+def pad_to_min_size_brute_force(image: Image.Image, factor: int) -> Image.Image:
+    w, h = image.size
+    if w >= factor and h >= factor:
+        return image
+    padded = Image.new("RGB", (max(w, factor), max(h, factor)), (255, 255, 255))
+    padded.paste(image, (0, 0))
+    return padded
+
+
+def get_random_image(generator: random.Random, mode: str, width: int, height: int) -> Image.Image:
+    channels = {"RGB": 3, "RGBA": 4, "LA": 2}.get(mode, 1)
+    pixels = np.random.default_rng(generator.randint(0, 2**32)).integers(0, 256, (height, width, channels), dtype=np.uint8)
+    if mode == "1":
+        return Image.fromarray(pixels[:, :, 0]).convert("1")
+    if mode == "P":
+        return Image.fromarray(pixels[:, :, 0], "L").convert("P")
+    return Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels, mode)
+
+
+class FakeResponse:
+    def __init__(self, status: int, content: str = "", headers: Optional[dict] = None):
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status)
+
+    async def read(self) -> bytes:
+        return orjson.dumps({"choices": [{"message": {"content": self.content}}]})
+
+
+class FakeSession:
+    # Hands out one scripted response (or connection error) per POST and records the bodies sent
+    def __init__(self, responses: list):
+        self.responses = responses
+        self.bodies = []
+
+    def post(self, url: str, data: bytes, headers: dict):
+        self.bodies.append(data)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class TestVllmOpenaiClient(TestCase):
+    def test_strip_code_fences(self):
+        self.assertEqual(
+            "<table><tr><td>1</td></tr></table>", _strip_code_fences("```html\n<table>\n<tr><td>1</td></tr>\n</table>\n```")
+        )
+        self.assertEqual("<table></table>", _strip_code_fences("  <table></table>  "))
+        self.assertEqual("", _strip_code_fences("```html"))
+        self.assertEqual("", _strip_code_fences(None))
+
+    def test_strip_code_fences_keeps_latex_newlines(self):
+        latex = _strip_code_fences("```latex\n\\alpha\nb % comment\n+ c\n```", strip_newlines=False)
+
+        self.assertEqual("\\alpha\nb % comment\n+ c", latex)
+
+    def test_strip_code_fences_matches_brute_force(self):
+        pieces = ["`", "```", "\n", " ", "a", "<t>", "\t", "\r\n"]
+        generator = random.Random(0)
+        for _ in range(20000):
+            text = "".join(generator.choice(pieces) for _ in range(generator.randint(0, 10)))
+            for strip_newlines in (True, False):
+                self.assertEqual(
+                    strip_code_fences_brute_force(text, strip_newlines), _strip_code_fences(text, strip_newlines), repr(text)
+                )
+
+    def test_pad_to_min_size_keeps_large_images(self):
+        image = Image.new("RGBA", (32, 40))
+
+        self.assertIs(image, _pad_to_min_size(image))
+
+    def test_pad_to_min_size_matches_brute_force(self):
+        generator = random.Random(0)
+        for mode in ["RGB", "RGBA", "LA", "L", "P", "1"]:
+            for _ in range(200):
+                image = get_random_image(generator, mode, generator.randint(1, 40), generator.randint(1, 40))
+                padded = _pad_to_min_size(image)
+                expected = pad_to_min_size_brute_force(image, 32)
+
+                self.assertEqual(expected.size, padded.size)
+                self.assertTrue(np.array_equal(np.asarray(expected.convert("RGB")), np.asarray(padded.convert("RGB"))))
+
+    @staticmethod
+    def ocr_formulas_batch(content: str, count: int = 2) -> list[str]:
+        with patch.object(vllm_openai_client, "_create_chat_completion_async", AsyncMock(return_value=content)):
+            return asyncio.run(
+                ocr_formulas_latex_batch_from_data_urls_async([f"data:image/png;base64,{i}" for i in range(count)])
+            )
+
+    def test_ocr_formulas_latex_batch(self):
+        chat_completion = AsyncMock(return_value="```json\n" + r'["\\frac{a}{b}", "x^{2} \\theta"]' + "\n```")
+
+        with patch.object(vllm_openai_client, "_create_chat_completion_async", chat_completion):
+            latex_list = asyncio.run(ocr_formulas_latex_batch_from_data_urls_async(["data:a", "data:b"]))
+
+        self.assertEqual([r"\frac{a}{b}", r"x^{2} \theta"], latex_list)
+        chat_completion.assert_awaited_once()
+        content = chat_completion.await_args.args[0][0]["content"]
+        self.assertEqual(["data:a", "data:b"], [part["image_url"]["url"] for part in content if part["type"] == "image_url"])
+
+    def test_ocr_formulas_latex_batch_rejects_malformed_answers(self):
+        for content in ["not json", '{"latex": "x"}', '["x"]', '["x", "y", "z"]', '["x", 2]', '"x"']:
+            with self.assertRaises(ValueError, msg=content):
+                self.ocr_formulas_batch(content)
+
+    def test_ocr_formulas_latex_batch_rejects_undoubled_backslashes(self):
+        # "\f", "\t", "\n", "\b" and "\r" are valid JSON escapes, so these parse into control characters
+        for latex in [r"\frac{a}{b}", r"\theta", r"\nu", r"\beta", r"\rho"]:
+            with self.assertRaises(ValueError, msg=latex):
+                self.ocr_formulas_batch(f'["{latex}", "x"]')
+
+        # Not a JSON escape at all, so the answer does not parse
+        with self.assertRaises(ValueError):
+            self.ocr_formulas_batch(r'["\alpha", "x"]')
+
+    @staticmethod
+    def post_chat_completion(session: FakeSession, retry_delay: Mock) -> str:
+        with (
+            patch.object(vllm_openai_client, "_get_async_session", return_value=session),
+            patch.object(vllm_openai_client, "_retry_delay", retry_delay),
+        ):
+            return asyncio.run(_post_chat_completion_async([{"role": "user", "content": []}], "model"))
+
+    def test_post_chat_completion_retries_server_errors(self):
+        session = FakeSession([FakeResponse(503, headers={"Retry-After": "2"}), FakeResponse(502), FakeResponse(200, "ok")])
+        retry_delay = Mock(return_value=0)
+
+        self.assertEqual("ok", self.post_chat_completion(session, retry_delay))
+        self.assertEqual(3, len(session.bodies))
+        self.assertEqual(1, len(set(session.bodies)))
+        self.assertEqual([((0, "2"),), ((1, None),)], retry_delay.call_args_list)
+
+    def test_post_chat_completion_does_not_retry_client_errors(self):
+        session = FakeSession([FakeResponse(400), FakeResponse(200, "ok")])
+
+        with self.assertRaises(aiohttp.ClientResponseError) as context:
+            self.post_chat_completion(session, Mock(return_value=0))
+
+        self.assertEqual(400, context.exception.status)
+        self.assertEqual(1, len(session.bodies))
+
+    def test_post_chat_completion_raises_after_last_retry(self):
+        session = FakeSession([FakeResponse(429), FakeResponse(429), FakeResponse(429), FakeResponse(200, "ok")])
+
+        with self.assertRaises(aiohttp.ClientResponseError) as context:
+            self.post_chat_completion(session, Mock(return_value=0))
+
+        self.assertEqual(429, context.exception.status)
+        self.assertEqual(3, len(session.bodies))
+
+    def test_post_chat_completion_retries_connection_errors(self):
+        session = FakeSession([aiohttp.ClientConnectionError(), FakeResponse(200, "ok")])
+        self.assertEqual("ok", self.post_chat_completion(session, Mock(return_value=0)))
+
+        session = FakeSession([aiohttp.ClientConnectionError() for _ in range(3)])
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            self.post_chat_completion(session, Mock(return_value=0))
+        self.assertEqual(3, len(session.bodies))
+
+    def test_retry_delay(self):
+        self.assertEqual(3.0, _retry_delay(0, "3"))
+        # Retry-After values that are too long or not in seconds fall back to exponential backoff with jitter
+        self.assertTrue(0.375 <= _retry_delay(0, "120") <= 0.5)
+        self.assertTrue(0.75 <= _retry_delay(1, "Wed, 21 Oct 2026 07:28:00 GMT") <= 1.0)
+        self.assertTrue(6.0 <= _retry_delay(10, None) <= 8.0)
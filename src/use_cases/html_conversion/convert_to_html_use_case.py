@@ -29,23 +29,7 @@ class ConvertToHtmlUseCase:
         else:
             analysis_result = self.pdf_analysis_service.analyze_pdf_layout(pdf_content, "", True, False)
 
-        segments: list[SegmentBox] = []
-        for item in analysis_result:
-            if isinstance(item, dict):
-                segment = SegmentBox(
-                    left=item.get("left", 0),
-                    top=item.get("top", 0),
-                    width=item.get("width", 0),
-                    height=item.get("height", 0),
-                    page_number=item.get("page_number", 1),
-                    page_width=item.get("page_width", 0),
-                    page_height=item.get("page_height", 0),
-                    text=item.get("text", ""),
-                    type=item.get("type", "TEXT"),
-                )
-                segments.append(segment)
-            elif isinstance(item, SegmentBox):
-                segments.append(item)
+        segments: list[SegmentBox] = SegmentBox.from_dicts(analysis_result)
 
         return self.html_conversion_service.convert_to_html(
             pdf_content, segments, extract_toc, dpi, output_file, target_languages, translation_model
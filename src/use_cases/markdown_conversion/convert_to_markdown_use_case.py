@@ -33,27 +33,8 @@ class ConvertToMarkdownUseCase:
         else:
             analysis_result = self.pdf_analysis_service.analyze_pdf_layout(pdf_content, "", parse_tables_and_math, False)
 
-        segments: list[SegmentBox] = []
-        for item in analysis_result:
-            if isinstance(item, dict):
-                segment = SegmentBox(
-                    left=item.get("left", 0),
-                    top=item.get("top", 0),
-                    width=item.get("width", 0),
-                    height=item.get("height", 0),
-                    page_number=item.get("page_number", 1),
-                    page_width=item.get("page_width", 0),
-                    page_height=item.get("page_height", 0),
-                    text=item.get("text", ""),
-                    # Normalize type from raw analysis payload (may be "Page footer", "Page_Footer", etc.)
-                    type=TokenType.from_text(item.get("type", "TEXT")),
-                )
-                segments.append(segment)
-            elif isinstance(item, SegmentBox):
-                segments.append(item)
-
         # Drop page footers from the final Markdown output.
-        segments = [s for s in segments if s.type != TokenType.PAGE_FOOTER]
+        segments: list[SegmentBox] = SegmentBox.from_dicts(analysis_result, skip_types=frozenset({TokenType.PAGE_FOOTER}))
 
         return self.markdown_conversion_service.convert_to_markdown(
             pdf_content, segments, extract_toc, dpi, output_file, target_languages, translation_model